@@ -0,0 +1,112 @@
+'''
+benchmark for the counterexample parser
+
+Times reading and parsing every counterexample file in the tool result directories (../*/*/*.counterexample.gz)
+with parse_ce() and with the previous string based parser, and checks that both give the same values. Run from
+the SCORING directory:
+
+    python3 -m bench.bench_ce_parse [glob]
+'''
+
+import sys
+import glob
+import time
+
+import numpy as np
+
+from counterexamples import read_ce_file, parse_ce
+
+def parse_ce_strings(content):
+    'the previous parser, splitting on ) and converting each value with float(), returns x_list, y_list'
+
+    assert content[0] == '(' and content[-1] == ')'
+    content = content[1:-1]
+
+    x_list = []
+    y_list = []
+
+    for part in content.split(')'):
+        part = part.strip()
+
+        if not part:
+            continue
+
+        assert part[0] == '('
+        part = part[1:]
+
+        name, num = part.split(' ')
+        assert name[0:2] in ['X_', 'Y_']
+
+        if name[0:2] == 'X_':
+            assert int(name[2:]) == len(x_list)
+            x_list.append(float(num))
+        else:
+            assert int(name[2:]) == len(y_list)
+            y_list.append(float(num))
+
+    return x_list, y_list
+
+def main():
+    'main entry point'
+
+    pattern = sys.argv[1] if len(sys.argv) > 1 else "../*/*/*.counterexample.gz"
+    paths = sorted(glob.glob(pattern))
+    assert paths, f"no counterexample files match {pattern}"
+
+    read_secs = old_secs = new_secs = 0.0
+    num_values = num_parsed = num_empty = num_rejected = 0
+    largest = (0, None, 0.0, 0.0)
+
+    for path in paths:
+        start = time.perf_counter()
+        content = read_ce_file(path)
+        read_secs += time.perf_counter() - start
+
+        if len(content) < 2:
+            num_empty += 1
+            continue
+
+        start = time.perf_counter()
+
+        try:
+            x_list, y_list = parse_ce_strings(content)
+        except (AssertionError, ValueError):
+            x_list = None
+
+        old_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+
+        try:
+            x, y = parse_ce(content)
+        except (AssertionError, ValueError):
+            x = None
+
+        new_time = time.perf_counter() - start
+
+        if x_list is None or x is None:
+            assert x_list is None and x is None, f"only one parser rejected {path}"
+            num_rejected += 1
+            continue
+
+        assert np.array_equal(x, x_list) and np.array_equal(y, y_list), f"parsers differ on {path}"
+
+        old_secs += old_time
+        new_secs += new_time
+        num_parsed += 1
+        num_values += len(x) + len(y)
+
+        if len(x) + len(y) > largest[0]:
+            largest = (len(x) + len(y), path, old_time, new_time)
+
+    print(f"{len(paths)} files: {num_parsed} parsed, {num_empty} empty, {num_rejected} rejected by both parsers")
+    print(f"{num_values} values, reading files took {read_secs:.3f}s")
+    print(f"previous parser: {old_secs:.3f}s, parse_ce: {new_secs:.3f}s ({old_secs / new_secs:.1f}x)")
+
+    if largest[1] is not None:
+        values, path, old_time, new_time = largest
+        print(f"largest file ({values} values): {old_time:.4f}s vs {new_time:.4f}s ({old_time / new_time:.1f}x), " + \
+              f"{path}")
+
+if __name__ == "__main__":
+    main()
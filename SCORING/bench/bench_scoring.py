@@ -0,0 +1,419 @@
+'''
+benchmark for the scoring engine on synthetic inputs
+
+Generates a results tree in a temporary directory: results.csv files for N tools x M categories x K instances,
+where a fraction of the answers disagree with the ground truth, and tiny onnx networks (a single dense layer)
+with matching vnnlib and counterexample files. It then times loading the results, compare_results(),
+get_score() / get_scores(), read_vnnlib_simple() and get_ce_diff(), and reports throughput and peak traced
+memory of each stage. It also checks that reverify executes the networks again instead of reusing stored
+outputs. Nothing is downloaded, so it runs offline. Run from the SCORING directory:
+
+    python3 -m bench.bench_scoring [--tools N] [--categories M] [--instances K] [--disagree RATE] [--json FILE]
+'''
+
+import os
+import io
+import json
+import gzip
+import time
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+from collections import defaultdict
+from contextlib import redirect_stdout
+
+import numpy as np
+import onnx
+from onnx import helper, numpy_helper, TensorProto
+
+from vnnlib import read_vnnlib_simple
+from counterexamples import get_ce_diff, CounterexampleResult
+from verdict_store import get_verdict_store
+from process_results import ToolResult, ResultCode, ScoringStats, compare_results, get_score, get_scores
+import profiling
+from profiling import get_peak_rss_mb
+from settings import Settings
+
+def parse_args():
+    'parse command line arguments'
+
+    parser = argparse.ArgumentParser(description='time the scoring engine on generated results')
+    parser.add_argument("--tools", type=int, default=8, help="number of tools")
+    parser.add_argument("--categories", type=int, default=4, help="number of categories")
+    parser.add_argument("--instances", type=int, default=200, help="instances per category")
+    parser.add_argument("--networks", type=int, default=4, help="networks per category")
+    parser.add_argument("--inputs", type=int, default=32, help="network inputs")
+    parser.add_argument("--outputs", type=int, default=10, help="network outputs")
+    parser.add_argument("--disagree", type=float, default=0.05,
+                        help="fraction of answers that are the opposite of the ground truth")
+    parser.add_argument("--timeouts", type=float, default=0.1, help="fraction of answers that are timeouts")
+    parser.add_argument("--repeats", type=int, default=3, help="runs of each stage, the fastest one is reported")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--json", metavar="FILE", help="also save the measurements to FILE, to track regressions")
+
+    return parser.parse_args()
+
+class SyntheticTree:
+    '''a generated results tree, laid out like the repository: root/SCORING is the working directory, tools
+    are in root/<tool>, and root/benchmarks_repo is used as Settings.BENCHMARK_REPO'''
+
+    def __init__(self, root, args):
+        self.root = Path(root)
+        self.args = args
+        self.rng = np.random.default_rng(args.seed)
+
+        self.scoring_dir = self.root / "SCORING"
+        self.benchmark_repo = self.root / "benchmarks_repo"
+
+        self.tool_names = [f"tool{i}" for i in range(args.tools)]
+        self.categories = [f"synth_{i}" for i in range(args.categories)]
+
+        self.vnnlib_files = [] # list of (vnnlib_filename, num_inputs, num_outputs)
+        self.ce_files = [] # list of (onnx_filename, vnnlib_filename, ce_path)
+
+    def generate(self):
+        'write all files'
+
+        for d in ["latex", "plots"]:
+            (self.scoring_dir / d).mkdir(parents=True)
+
+        rows = {tool: [] for tool in self.tool_names}
+
+        # the test instance, which sets the overhead of each tool
+        overheads = self.rng.uniform(0.5, 2.0, size=len(self.tool_names))
+
+        for tool, overhead in zip(self.tool_names, overheads):
+            rows[tool].append(["test", "./benchmarks/test/onnx/test_nano.onnx",
+                               "./benchmarks/test/vnnlib/test_nano.vnnlib", "1.0", "unsat", f"{overhead:.6f}"])
+
+        for cat in self.categories:
+            self.generate_category(cat, rows, overheads)
+
+        for tool in self.tool_names:
+            with open(self.root / tool / "results.csv", 'w', encoding='utf-8') as f:
+                for row in rows[tool]:
+                    f.write(",".join(row) + "\n")
+
+    def generate_category(self, cat, rows, overheads):
+        'write the networks, specs and counterexamples of one category, and add its csv rows'
+
+        args = self.args
+        rng = self.rng
+        cat_dir = self.benchmark_repo / "benchmarks" / cat
+        networks = []
+
+        for n in range(args.networks):
+            net = f"net{n}"
+            onnx_filename = cat_dir / "onnx" / f"{net}.onnx"
+            w, b = write_dense_network(onnx_filename, rng, args.inputs, args.outputs)
+            networks.append((net, onnx_filename, w, b))
+
+        for index in range(args.instances):
+            net, onnx_filename, w, b = networks[index % len(networks)]
+            prop = f"prop_{index}"
+            vnnlib_filename = cat_dir / "vnnlib" / f"{prop}.vnnlib"
+
+            center = rng.uniform(-1, 1, size=args.inputs)
+            eps = 0.05
+
+            # ground truth: violated instances get a witness inside the box, and a spec that it violates
+            violated = rng.random() < 0.5
+            witness = np.clip(center + rng.uniform(-eps, eps, size=args.inputs), center - eps, center + eps)
+            witness_out = dense_output(w, b, witness)
+
+            if violated:
+                label = int(rng.choice([i for i in range(args.outputs) if i != np.argmax(witness_out)]))
+            else:
+                label = int(np.argmax(dense_output(w, b, center)))
+
+            write_vnnlib(vnnlib_filename, center - eps, center + eps, label, args.outputs)
+            self.vnnlib_files.append((str(vnnlib_filename), args.inputs, args.outputs))
+
+            for tool, overhead in zip(self.tool_names, overheads):
+                prepare_time = rng.uniform(0.1, 2.0)
+                run_time = overhead + rng.exponential(5.0)
+
+                if rng.random() < args.timeouts:
+                    result = "timeout"
+                    run_time = 60.0
+                else:
+                    claims_violated = violated != (rng.random() < args.disagree)
+                    result = "sat" if claims_violated else "unsat"
+
+                    if claims_violated:
+                        ce_path = self.root / tool / cat / f"{net}_{prop}.counterexample.gz"
+                        self.write_counterexample(ce_path, violated, w, b, witness, witness_out, center)
+                        self.ce_files.append((str(onnx_filename), str(vnnlib_filename), str(ce_path)))
+
+                rows[tool].append([cat, f"./benchmarks/{cat}/onnx/{net}.onnx",
+                                   f"./benchmarks/{cat}/vnnlib/{prop}.vnnlib", f"{prepare_time:.6f}", result,
+                                   f"{run_time:.6f}"])
+
+    def write_counterexample(self, ce_path, violated, w, b, witness, witness_out, center):
+        'write a correct counterexample, or for an instance that holds, one of the kinds of incorrect ones'
+
+        if violated:
+            x, y = witness, witness_out
+        else:
+            kind = self.rng.integers(3)
+            x, y = center, dense_output(w, b, center)
+
+            if kind == 1:
+                y = y + 0.5 # execution doesn't match
+            elif kind == 2:
+                x = y = None # empty file
+
+        ce_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with gzip.open(ce_path, 'wt') as f:
+            if x is not None:
+                f.write("(" + "\n".join(f"(X_{i} {v})" for i, v in enumerate(x)) + "\n" + \
+                        "\n".join(f"(Y_{i} {v})" for i, v in enumerate(y)) + ")\n")
+
+def write_dense_network(onnx_filename, rng, num_inputs, num_outputs):
+    'write an onnx network computing x * w + b with a dynamic batch dimension, returns w, b'
+
+    w = rng.normal(size=(num_inputs, num_outputs)).astype(np.float32)
+    b = rng.normal(size=num_outputs).astype(np.float32)
+
+    nodes = [helper.make_node('MatMul', ['x', 'w'], ['xw']), helper.make_node('Add', ['xw', 'b'], ['y'])]
+    inp = helper.make_tensor_value_info('x', TensorProto.FLOAT, ['N', num_inputs])
+    out = helper.make_tensor_value_info('y', TensorProto.FLOAT, ['N', num_outputs])
+    initializers = [numpy_helper.from_array(w, 'w'), numpy_helper.from_array(b, 'b')]
+    graph = helper.make_graph(nodes, 'dense', [inp], [out], initializers)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+
+    onnx_filename.parent.mkdir(parents=True, exist_ok=True)
+    onnx.save(model, str(onnx_filename))
+
+    return w, b
+
+def dense_output(w, b, x):
+    'the output of a network from write_dense_network(), as onnxruntime computes it (in float32)'
+
+    return (x.astype(np.float32) @ w + b).astype(float)
+
+def write_vnnlib(vnnlib_filename, lb, ub, label, num_outputs):
+    'write a spec that is violated if some output is at least as large as the label output'
+
+    lines = [f"(declare-const X_{i} Real)" for i in range(len(lb))]
+    lines += [f"(declare-const Y_{i} Real)" for i in range(num_outputs)]
+
+    for i, (l, u) in enumerate(zip(lb, ub)):
+        lines.append(f"(assert (>= X_{i} {l}))")
+        lines.append(f"(assert (<= X_{i} {u}))")
+
+    lines.append("(assert (or")
+    lines += [f"    (and (>= Y_{i} Y_{label}))" for i in range(num_outputs) if i != label]
+    lines.append("))")
+
+    vnnlib_filename.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(vnnlib_filename, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+
+def measure(name, func, num_items, repeats, results, setup=None):
+    '''time func() repeats times and once more with tracemalloc, printed output is discarded
+
+    setup() is called before each run, outside of the timing. adds the measurement to results'''
+
+    best = np.inf
+
+    for _ in range(repeats):
+        if setup:
+            setup()
+
+        start = time.perf_counter()
+
+        with redirect_stdout(io.StringIO()):
+            func()
+
+        best = min(best, time.perf_counter() - start)
+
+    if setup:
+        setup()
+
+    tracemalloc.start()
+
+    with redirect_stdout(io.StringIO()):
+        func()
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    results[name] = {'secs': best, 'items': num_items, 'per_sec': num_items / best, 'peak_mb': peak / 1024**2}
+
+    print(f"{name:<28} {best:10.4f} {num_items:>9} {num_items / best:>13.1f} {peak / 1024**2:>12.1f}")
+
+def load_results(tree):
+    'load every results.csv, returns the ToolResult list'
+
+    rv = []
+
+    for tool in tree.tool_names:
+        csv_path = str(tree.root / tool / "results.csv")
+        rv.append(ToolResult(True, tool, csv_path, [], [], ToolResult.load_csv(csv_path)))
+
+    return rv
+
+def score_matrices(result_list):
+    '''get the tool names, results and times matrices and per-row counterexample results of all categories, as
+    passed to get_scores(). Every counterexample is taken as correct.'''
+
+    tool_names = [t.tool_name for t in result_list]
+    results = []
+    times = []
+
+    for cat in sorted(result_list[0].category_to_results):
+        tools = [t for t in result_list if cat in t.category_to_results]
+
+        if len(tools) != len(result_list):
+            continue
+
+        results.append(np.array([t.category_to_results[cat].results for t in tools]).T)
+        times.append(np.array([t.category_to_results[cat].run_times for t in tools]).T)
+
+    results = np.concatenate(results)
+    times = np.concatenate(times)
+    ce_results = []
+
+    for row in results:
+        if np.any(row == ResultCode.HOLDS) and np.any(row == ResultCode.VIOLATED):
+            ce_results.append({tool_names[i]: CounterexampleResult.CORRECT
+                               for i in np.nonzero(row == ResultCode.VIOLATED)[0]})
+        else:
+            ce_results.append({})
+
+    return tool_names, results, times, ce_results
+
+def get_score_cells(tool_names, results, times, ce_results):
+    'call get_score() on each cell, like the scoring did before get_scores()'
+
+    stats = ScoringStats()
+
+    for index, row in enumerate(results):
+        times_holds = [float(times[index, i]) for i in range(len(tool_names)) if row[i] == ResultCode.HOLDS]
+        times_violated = [float(times[index, i]) for i in range(len(tool_names)) if row[i] == ResultCode.VIOLATED]
+
+        for tool_index, tool_name in enumerate(tool_names):
+            get_score(tool_name, ResultCode.NAMES[row[tool_index]], float(times[index, tool_index]), False,
+                      times_holds, times_violated, ce_results[index], stats)
+
+def check_reverify_executes(check_all_ce, store):
+    '''check that stored network outputs are reused, except with reverify, which executes the networks again'''
+
+    profiling.enable()
+    executed = {}
+
+    for reverify in [False, True]:
+        store.clear_verdicts()
+        profiling.get_profiler().reset()
+
+        with redirect_stdout(io.StringIO()):
+            check_all_ce(reverify)
+
+        executed[reverify] = profiling.get_profiler().counters["ce_executed"]
+
+    profiling.enable(False)
+
+    print(f"\nnetwork executions with stored outputs: {executed[False]}, with reverify: {executed[True]}")
+    assert executed[False] == 0, "stored network outputs were not reused"
+    assert executed[True] > 0, "reverify did not execute the networks again"
+
+def main():
+    'main entry point'
+
+    args = parse_args()
+    start_dir = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tree = SyntheticTree(tmp_dir, args)
+
+        start = time.perf_counter()
+        tree.generate()
+        num_rows = args.tools * args.categories * args.instances
+
+        print(f"generated {args.tools} tools x {args.categories} categories x {args.instances} instances " + \
+              f"({len(tree.ce_files)} counterexamples) in {time.perf_counter() - start:.1f}s")
+
+        # relative paths in Settings (latex, plots, caches) and in counterexample_tuple() resolve into the tree
+        os.chdir(tree.scoring_dir)
+        Settings.BENCHMARK_REPO = str(tree.benchmark_repo)
+        Settings.CE_REVERIFY = True
+        Settings.INCREMENTAL = False
+
+        results = {}
+
+        print(f"\n{'stage':<28} {'best s':>10} {'items':>9} {'items/s':>13} {'peak MB':>12}")
+
+        measure("load_results", lambda: load_results(tree), num_rows, args.repeats, results)
+
+        with redirect_stdout(io.StringIO()):
+            result_list = load_results(tree)
+
+        def run_compare_results():
+            gnuplot_tool_cat_times = {tool: defaultdict(list) for tool in tree.tool_names}
+            compare_results(tree.tool_names, gnuplot_tool_cat_times, result_list, True, True, ScoringStats())
+
+        num_instances = args.categories * args.instances
+        measure("compare_results", run_compare_results, num_instances, args.repeats, results,
+                setup=lambda: open(Settings.SCORED_LATEX, 'w', encoding='utf-8').close())
+
+        tool_names, score_results, times, ce_results = score_matrices(result_list)
+
+        measure("get_score (per cell)", lambda: get_score_cells(tool_names, score_results, times, ce_results),
+                score_results.size, args.repeats, results)
+        measure("get_scores", lambda: get_scores(tool_names, score_results, times,
+                                                 np.zeros(len(score_results), dtype=bool), ce_results,
+                                                 ScoringStats()),
+                score_results.size, args.repeats, results)
+
+        def clear_vnnlib_cache():
+            cache_dir = Path(Settings.VNNLIB_CACHE_DIR)
+
+            if cache_dir.is_dir():
+                for entry in cache_dir.iterdir():
+                    for path in entry.iterdir():
+                        path.unlink()
+
+                    entry.rmdir()
+
+        def read_all_vnnlib():
+            for vnnlib_filename, num_inputs, num_outputs in tree.vnnlib_files:
+                read_vnnlib_simple(vnnlib_filename, num_inputs, num_outputs)
+
+        measure("read_vnnlib_simple (cold)", read_all_vnnlib, len(tree.vnnlib_files), args.repeats, results,
+                setup=clear_vnnlib_cache)
+        measure("read_vnnlib_simple (warm)", read_all_vnnlib, len(tree.vnnlib_files), args.repeats, results)
+
+        store = get_verdict_store()
+
+        def clear_store():
+            store.clear_verdicts()
+            store.clear_outputs()
+
+        def check_all_ce(reverify=True):
+            for onnx_filename, vnnlib_filename, ce_path in tree.ce_files:
+                get_ce_diff(onnx_filename, vnnlib_filename, ce_path, Settings.COUNTEREXAMPLE_TOL, reverify)
+
+        measure("get_ce_diff (cold)", check_all_ce, len(tree.ce_files), args.repeats, results, setup=clear_store)
+        measure("get_ce_diff (memoized)", lambda: check_all_ce(False), len(tree.ce_files), args.repeats, results,
+                setup=store.clear_verdicts)
+
+        check_reverify_executes(check_all_ce, store)
+
+        peak_rss_mb = get_peak_rss_mb()
+        print(f"\npeak rss: {peak_rss_mb:.1f} MB")
+
+        os.chdir(start_dir)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'stages': results, 'peak_rss_mb': peak_rss_mb}, f, indent=2)
+
+        print(f"saved measurements to {args.json}")
+
+if __name__ == "__main__":
+    main()
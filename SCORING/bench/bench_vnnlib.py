@@ -0,0 +1,93 @@
+'''
+benchmark for the vnnlib parser fast path
+
+Times read_vnnlib_spec() with and without the fast path on the largest vnnlib files of each category in
+Settings.BENCHMARK_REPO. Run from the SCORING directory:
+
+    python3 -m bench.bench_vnnlib [files_per_category]
+'''
+
+import sys
+import re
+import glob
+import gzip
+import time
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from vnnlib import read_vnnlib_spec
+from settings import Settings
+
+def get_num_inputs_outputs_from_declares(vnnlib_filename):
+    'get the number of inputs and outputs from the declare-const statements'
+
+    with open(vnnlib_filename, 'r') as f:
+        text = f.read()
+
+    num_inputs = 1 + max(int(i) for i in re.findall(r"declare-const\s+X_(\d+)", text))
+    num_outputs = 1 + max(int(i) for i in re.findall(r"declare-const\s+Y_(\d+)", text))
+
+    return num_inputs, num_outputs
+
+def time_parse(vnnlib_filename, num_inputs, num_outputs, use_fast_path, repeats):
+    'returns the best time over several runs, and the parsed spec'
+
+    best = np.inf
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        spec = read_vnnlib_spec(vnnlib_filename, num_inputs, num_outputs, use_fast_path=use_fast_path)
+        best = min(best, time.perf_counter() - start)
+
+    return best, spec
+
+def same_spec(a, b):
+    'are two parsed VnnlibSpec objects identical?'
+
+    arrays1 = a.to_arrays()
+    arrays2 = b.to_arrays()
+
+    return all(np.array_equal(arrays1[name], arrays2[name]) for name in arrays1)
+
+def main():
+    'main entry point'
+
+    files_per_category = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    repeats = 3
+
+    cat_dirs = sorted(glob.glob(f"{Settings.BENCHMARK_REPO}/benchmarks/*/vnnlib"))
+    assert cat_dirs, f"no benchmarks found in {Settings.BENCHMARK_REPO}/benchmarks"
+
+    print(f"{'category':<30} {'file':<50} {'MB':>8} {'general':>9} {'fast':>9} {'speedup':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for cat_dir in cat_dirs:
+            cat = Path(cat_dir).parent.name
+            paths = glob.glob(f"{cat_dir}/*.vnnlib") + glob.glob(f"{cat_dir}/*.vnnlib.gz")
+            paths.sort(key=lambda p: Path(p).stat().st_size, reverse=True)
+
+            for path in paths[:files_per_category]:
+                if path.endswith('.gz'):
+                    plain_path = f"{tmp_dir}/{Path(path).stem}"
+
+                    with gzip.open(path, 'rb') as fin, open(plain_path, 'wb') as fout:
+                        shutil.copyfileobj(fin, fout)
+                else:
+                    plain_path = path
+
+                num_inputs, num_outputs = get_num_inputs_outputs_from_declares(plain_path)
+                mb = Path(plain_path).stat().st_size / 1024**2
+
+                general_secs, general_spec = time_parse(plain_path, num_inputs, num_outputs, False, repeats)
+                fast_secs, fast_spec = time_parse(plain_path, num_inputs, num_outputs, True, repeats)
+
+                assert same_spec(general_spec, fast_spec), f"fast path result differs for {path}"
+
+                print(f"{cat:<30} {Path(path).name[:50]:<50} {mb:8.2f} {general_secs:9.4f} {fast_secs:9.4f} " + \
+                      f"{general_secs / fast_secs:7.1f}x")
+
+if __name__ == "__main__":
+    main()
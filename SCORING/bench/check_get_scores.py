@@ -0,0 +1,83 @@
+'''
+randomized check of the vectorized scoring
+
+Scores random result matrices (with ties, timeouts and disputed counterexamples) with get_scores() and with
+get_score() called on each cell, which remains the reference implementation in process_results.py, and checks
+that the scores and the ScoringStats are the same. Run from the SCORING directory:
+
+    python3 -m bench.check_get_scores [num_trials] [seed]
+'''
+
+import sys
+
+import numpy as np
+
+from counterexamples import CounterexampleResult
+from process_results import ResultCode, ScoringStats, get_score, get_scores
+
+def test_get_scores(num_trials=200, seed=0):
+    """check that get_scores() matches calling get_score() on each cell, including the stats"""
+
+    rng = np.random.default_rng(seed)
+    ce_choices = [CounterexampleResult.CORRECT, CounterexampleResult.NO_CE,
+                  CounterexampleResult.EXEC_DOESNT_MATCH, CounterexampleResult.SPEC_NOT_VIOLATED]
+
+    for trial in range(num_trials):
+        num_instances = int(rng.integers(1, 30))
+        num_tools = int(rng.integers(1, 8))
+        tool_names = [f"tool{i}" for i in range(num_tools)]
+
+        results = rng.choice([ResultCode.HOLDS, ResultCode.VIOLATED, ResultCode.TIMEOUT, ResultCode.UNKNOWN],
+                             size=(num_instances, num_tools), p=[0.4, 0.4, 0.1, 0.1]).astype(np.int8)
+
+        # coarse times so that ties and the 0.2 second window are common
+        times = rng.integers(0, 30, size=results.shape) / rng.choice([5.0, 10.0, 20.0])
+
+        ce_results = []
+
+        for index in range(num_instances):
+            d = {}
+
+            if np.any(results[index] == ResultCode.HOLDS) and np.any(results[index] == ResultCode.VIOLATED):
+                for tool_index in np.nonzero(results[index] == ResultCode.VIOLATED)[0]:
+                    d[tool_names[tool_index]] = ce_choices[rng.integers(len(ce_choices))]
+
+            ce_results.append(d)
+
+        # per-cell reference
+        expected_stats = ScoringStats()
+        expected = np.zeros((5,) + results.shape, dtype=int)
+
+        for index in range(num_instances):
+            row = results[index]
+            times_holds = [float(times[index, i]) for i in range(num_tools) if row[i] == ResultCode.HOLDS]
+            times_violated = [float(times[index, i]) for i in range(num_tools) if row[i] == ResultCode.VIOLATED]
+
+            for tool_index, tool_name in enumerate(tool_names):
+                res = ResultCode.NAMES[row[tool_index]]
+                expected[:, index, tool_index] = get_score(tool_name, res, float(times[index, tool_index]), False,
+                                                           times_holds, times_violated, ce_results[index],
+                                                           expected_stats)
+
+        actual_stats = ScoringStats()
+        actual = np.array(get_scores(tool_names, results, times, np.zeros(num_instances, dtype=bool), ce_results,
+                                     actual_stats), dtype=int)
+
+        assert np.array_equal(expected, actual), f"trial {trial}: get_scores() mismatch"
+
+        for name in ScoringStats.NAMES:
+            assert list(getattr(expected_stats, name).items()) == list(getattr(actual_stats, name).items()), \
+                f"trial {trial}: {name} mismatch"
+
+    print(f"get_scores() matched get_score() in {num_trials} trials")
+
+def main():
+    'main entry point'
+
+    num_trials = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    test_get_scores(num_trials, seed)
+
+if __name__ == "__main__":
+    main()
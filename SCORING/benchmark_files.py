@@ -0,0 +1,117 @@
+'''
+resolving benchmark onnx / vnnlib files, which may only exist as .gz in the benchmark repo
+
+Compressed files are extracted once into Settings.BENCHMARK_CACHE_DIR instead of next to the original. Extraction
+streams through shutil.copyfileobj in chunks and renames a temporary file into place, so several worker processes
+can resolve the same file at once without seeing a partially written copy. Resolved paths are remembered per
+process, so repeated lookups don't touch the file system again.
+'''
+
+import os
+import gzip
+import shutil
+import tempfile
+from pathlib import Path
+
+from settings import Settings
+from profiling import profiled
+
+class BenchmarkResolver:
+    '''maps benchmark files to paths that can be read directly, extracting .gz files to a cache dir'''
+
+    def __init__(self, benchmark_repo, cache_dir, chunk_size=1024**2):
+        self.benchmark_repo = benchmark_repo
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+
+        self.paths = {} # maps path in the benchmark repo -> readable path
+
+        self.num_extracted = 0
+
+    def get_benchmark_filenames(self, cat, net, prop):
+        '''get the onnx and vnnlib filenames for an instance'''
+
+        onnx_filename = self.resolve(f"benchmarks/{cat}/onnx/{net}.onnx")
+        vnnlib_filename = self.resolve(f"benchmarks/{cat}/vnnlib/{prop}.vnnlib")
+
+        assert onnx_filename is not None, f"onnx file '{self.benchmark_repo}/benchmarks/{cat}/onnx/{net}.onnx' " + \
+            f"not found. After cloning benchmarks did you run setup.sh in {self.benchmark_repo}?"
+
+        assert vnnlib_filename is not None, \
+            f"vnnlib file not found: {self.benchmark_repo}/benchmarks/{cat}/vnnlib/{prop}.vnnlib"
+
+        return onnx_filename, vnnlib_filename
+
+    def resolve(self, rel_path):
+        '''get a readable path for a file in the benchmark repo, or None if neither it nor a .gz version exist'''
+
+        rv = self.paths.get(rel_path)
+
+        if rv is None:
+            path = Path(self.benchmark_repo) / rel_path
+            gz_path = Path(f"{path}.gz")
+
+            if path.is_file():
+                rv = str(path)
+            elif gz_path.is_file():
+                rv = self.extract(gz_path, Path(self.cache_dir) / rel_path)
+            else:
+                print(f"WARNING: file and gz path don't exist: {gz_path}")
+                return None
+
+            self.paths[rel_path] = rv
+
+        return rv
+
+    @profiled("extract_benchmark_gz")
+    def extract(self, gz_path, dest_path):
+        '''extract a .gz file to dest_path, unless an extraction of the same .gz file is already there
+
+        the extracted file gets the modification time of the .gz file, which is used to detect stale copies'''
+
+        gz_stat = gz_path.stat()
+
+        try:
+            if dest_path.stat().st_mtime_ns == gz_stat.st_mtime_ns:
+                return str(dest_path)
+        except FileNotFoundError:
+            pass
+
+        print(f"extracting from {gz_path} to {dest_path}")
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with tempfile.NamedTemporaryFile('wb', dir=dest_path.parent, suffix='.tmp', delete=False) as fout:
+            try:
+                with gzip.open(gz_path, 'rb') as fin:
+                    shutil.copyfileobj(fin, fout, self.chunk_size)
+            except BaseException:
+                fout.close()
+                os.remove(fout.name)
+                raise
+
+        os.utime(fout.name, ns=(gz_stat.st_atime_ns, gz_stat.st_mtime_ns))
+        os.replace(fout.name, dest_path)
+        self.num_extracted += 1
+
+        return str(dest_path)
+
+_resolver = None
+_resolver_key = None
+
+def get_benchmark_resolver():
+    '''get this process's BenchmarkResolver for Settings.BENCHMARK_REPO'''
+
+    global _resolver, _resolver_key
+
+    key = (Settings.BENCHMARK_REPO, Settings.BENCHMARK_CACHE_DIR)
+
+    if _resolver is None or _resolver_key != key:
+        _resolver = BenchmarkResolver(*key)
+        _resolver_key = key
+
+    return _resolver
+
+def get_benchmark_filenames(cat, net, prop):
+    '''get the onnx and vnnlib filenames for an instance, extracting them from .gz files if needed'''
+
+    return get_benchmark_resolver().get_benchmark_filenames(cat, net, prop)
@@ -2,23 +2,31 @@
 code related to checking for counterexamples
 """
 
-from pathlib import Path
+import os
+import io
 import gzip
-import datetime
+import hashlib
+import functools
+import itertools
+from collections import defaultdict
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
-import onnx
-import onnxruntime as ort
 
-from vnnlib import read_vnnlib_simple, get_io_nodes
+from vnnlib import get_spec_evaluator, file_sha256
+from model_cache import get_model
+from benchmark_files import get_benchmark_filenames
+from verdict_store import get_verdict_store
+import profiling
+from profiling import profiled
 
-from cachier import cachier
 from settings import Settings
 
-def predict_with_onnxruntime(model_def, *inputs):
-    'run an onnx model'
+@profiled("onnx_inference")
+def predict_with_onnxruntime(sess, *inputs):
+    'run an onnx model using an existing InferenceSession'
     
-    sess = ort.InferenceSession(model_def.SerializeToString())
     names = [i.name for i in sess.get_inputs()]
 
     inp = dict(zip(names, inputs))
@@ -28,6 +36,7 @@ def predict_with_onnxruntime(model_def, *inputs):
 
     return res[0]
 
+@profiled("read_ce_file")
 def read_ce_file(ce_path):
     """get file contents"""
 
@@ -50,61 +59,238 @@ class CounterexampleResult:
     EXEC_DOESNT_MATCH = "exec_doesnt_match"
     SPEC_NOT_VIOLATED = "spec_not_violated"
 
+class ValidationStage:
+    """enum for the stage at which checking a counterexample stopped, saved with each verdict
+
+    the cheap checks come first, so the network is only loaded and executed for counterexamples that pass them"""
+
+    READ = "read" # the counterexample file was empty
+    INPUT_BOX = "input_box" # X in the file was outside the input set of the spec
+    OUTPUT_SPEC = "output_spec" # Y in the file did not violate the spec
+    EXECUTION = "execution" # the network was executed on X and its output compared to Y
+
 def is_correct_counterexample(ce_path, cat, net, prop):
     """is the counterexample correct? returns an element of CounterexampleResult 
     """
 
     print(f"Checking ce path: {ce_path}")
 
-    benchmark_repo = Settings.BENCHMARK_REPO
- 
-    onnx_filename = f"{benchmark_repo}/benchmarks/{cat}/onnx/{net}.onnx"
-    vnnlib_filename = f"{benchmark_repo}/benchmarks/{cat}/vnnlib/{prop}.vnnlib"
+    onnx_filename, vnnlib_filename = get_benchmark_filenames(cat, net, prop)
 
-    if not Path(onnx_filename).is_file():
-        # try unzipping
-        gz_path = f"{onnx_filename}.gz"
+    res, msg = get_ce_diff(onnx_filename, vnnlib_filename, ce_path, Settings.COUNTEREXAMPLE_TOL,
+                           Settings.CE_REVERIFY)
 
-        if not Path(gz_path).is_file():
-            print(f"WARNING: onnx and gz path don't exist: {gz_path}")
-        else:
-            print(f"extracting from {gz_path} to {onnx_filename}")
-            
-            with gzip.open(gz_path, 'rb') as f:
-                content = f.read()
+    print(f"{res}: {msg}")
+    
+    return res
 
-                with open(onnx_filename, 'wb') as fout:
-                    fout.write(content)
+@profiled("check_counterexamples")
+def check_counterexamples(ce_tuples, reverify=None):
+    """check many counterexamples at once
 
-    if not Path(vnnlib_filename).is_file():
-        # try unzipping
-        gz_path = f"{vnnlib_filename}.gz"
+    ce_tuples is a list of (ce_path, cat, net, prop), as passed to is_correct_counterexample
 
-        if Path(gz_path).is_file():
-            print(f"extracting from {gz_path} to {vnnlib_filename}")
-            
-            with gzip.open(gz_path, 'rb') as f:
-                content = f.read()
+    Verdicts and network outputs found in the verdict store are reused unless reverify is True (default:
+    Settings.CE_REVERIFY), in which case the networks are executed again.
 
-                with open(vnnlib_filename, 'wb') as fout:
-                    fout.write(content)
+    Counterexamples are grouped by network and checked with check_ce_batch(), so that each network is executed
+    once per chunk of Settings.CE_BATCH_SIZE counterexamples rather than once per counterexample, and not at all
+    if none of its counterexamples pass the input box and output spec checks.
 
-    assert Path(onnx_filename).is_file(), f"onnx file '{onnx_filename}' not found. " + \
-        f"After cloning benchmarks did you run setup.sh in {Settings.BENCHMARK_REPO}?"
-    
-    assert Path(vnnlib_filename).is_file(), f"vnnlib file not found: {vnnlib_filename}"
+    returns a dict mapping each tuple to an element of CounterexampleResult
+    """
 
-    ################################################
+    rv = {}
+    tol = Settings.COUNTEREXAMPLE_TOL
+    store = get_verdict_store()
 
-    res, msg = get_ce_diff(onnx_filename, vnnlib_filename, ce_path, Settings.COUNTEREXAMPLE_TOL)
+    if reverify is None:
+        reverify = Settings.CE_REVERIFY
 
-    print(f"{res}: {msg}")
-    
-    return res
+    # maps onnx_filename -> list of (tup, vnnlib_filename, x_list, y_list, verdict_key)
+    network_to_pending = defaultdict(list)
+
+    for tup in ce_tuples:
+        if tup in rv:
+            continue
+
+        ce_path, cat, net, prop = tup
+        onnx_filename, vnnlib_filename = get_benchmark_filenames(cat, net, prop)
+
+        content = read_ce_file(ce_path)
+
+        if len(content) < 2:
+            rv[tup] = CounterexampleResult.NO_CE
+            print(f"Checking ce path: {ce_path}")
+            print(f"{rv[tup]}: Note: no counter example provided in {ce_path}")
+            continue
+
+        key = get_verdict_key(onnx_filename, vnnlib_filename, content, tol)
+        stored = None if reverify else store.get(key)
+        profiling.count("verdict_store_hits" if stored is not None else "verdict_store_misses")
+
+        if stored is not None:
+            rv[tup], msg = stored
+            print(f"Checking ce path: {ce_path}")
+            print(f"{rv[tup]}: {msg}")
+            continue
+
+        x_list, y_list = parse_ce(content)
+        network_to_pending[onnx_filename].append((tup, vnnlib_filename, x_list, y_list, key))
+
+    for onnx_filename, pending in network_to_pending.items():
+        items = [(vnnlib_filename, x_list, y_list) for _, vnnlib_filename, x_list, y_list, _ in pending]
+        checked = check_ce_batch(onnx_filename, items, tol, reverify)
+
+        for (tup, _, _, _, key), (res, msg, stage) in zip(pending, checked):
+            rv[tup] = res
+            store.put(key, res, msg, tup[0], stage)
+
+            print(f"Checking ce path: {tup[0]}")
+            print(f"{res}: {msg}")
+
+    return rv
+
+def check_counterexamples_parallel(ce_tuples, max_workers=None):
+    """check counterexamples using a pool of worker processes
+
+    The counterexamples are split up by network and each network's group is checked by a single worker using
+    check_counterexamples, so every network is loaded in only one process. Each worker keeps its own model cache.
+    Worker output is printed in order once the group is done.
+
+    max_workers defaults to Settings.CE_NUM_WORKERS. returns a dict mapping each tuple to an element of
+    CounterexampleResult
+    """
+
+    network_to_tuples = defaultdict(list)
+
+    for tup in ce_tuples:
+        _ce_path, cat, net, prop = tup
+
+        # extract any .gz files here, so that workers don't race on them
+        onnx_filename, _ = get_benchmark_filenames(cat, net, prop)
+        network_to_tuples[onnx_filename].append(tup)
+
+    groups = list(network_to_tuples.values())
+    reverify = Settings.CE_REVERIFY
+
+    if max_workers is None:
+        max_workers = Settings.CE_NUM_WORKERS or os.cpu_count()
+
+    max_workers = min(max_workers, len(groups))
+
+    if max_workers <= 1:
+        return check_counterexamples(ce_tuples, reverify)
+
+    rv = {}
+
+    profile = profiling.is_enabled()
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for results, output, snapshot in executor.map(_check_counterexamples_worker, groups,
+                                                      [reverify] * len(groups), [profile] * len(groups)):
+            print(output, end='')
+            rv.update(results)
+
+            if profile:
+                profiling.get_profiler().merge(snapshot)
+
+    return rv
+
+def _check_counterexamples_worker(ce_tuples, reverify, profile):
+    """process pool entry point, returns the results of check_counterexamples, its printed output and a
+    profiling snapshot"""
+
+    profiling.start_worker(profile)
+    buf = io.StringIO()
+
+    with redirect_stdout(buf):
+        results = check_counterexamples(ce_tuples, reverify)
+
+    return results, buf.getvalue(), profiling.get_profiler().snapshot()
+
+def predict_batch(model, x_lists):
+    """execute a CachedModel on several inputs at once, returns a list of flattened outputs"""
+
+    flatten_order = 'C'
+    x_in = np.array(x_lists, dtype=model.input_dtype)
+
+    if len(x_lists) == 1:
+        x_in = x_in.reshape(model.input_shape, order=flatten_order)
+        output = predict_with_onnxruntime(model.sess, x_in)
+
+        return [output.flatten(flatten_order)]
+
+    assert model.dynamic_batch
+    x_in = x_in.reshape((len(x_lists),) + model.input_shape[1:], order=flatten_order)
+
+    try:
+        output = predict_with_onnxruntime(model.sess, x_in)
+    except Exception as e: # pylint: disable=broad-except
+        # some networks declare a symbolic batch dimension but only work with batch size 1
+        print(f"WARNING: batched execution of {model.onnx_filename} failed ({e}), running one at a time")
+        output = None
+
+    if output is None or output.shape[0] != len(x_lists):
+        return [predict_batch(model, [x_list])[0] for x_list in x_lists]
+
+    return [o.flatten(flatten_order) for o in output]
+
+@profiled("parse_ce")
+def parse_ce(content):
+    """parse the contents of a counterexample file, returns numpy arrays x, y
+
+    the contents are split into name / value tokens once, the names are compared against the expected
+    X_0, X_1, ... and Y_0, Y_1, ... sequences and all values are converted in a single numpy call"""
 
-@cachier(stale_after=datetime.timedelta(days=7))
-def get_ce_diff(onnx_filename, vnnlib_filename, ce_path, tol):
-    """get difference in execution"""
+    assert content[0] == '(' and content[-1] == ')'
+
+    tokens = content.replace('(', ' ').replace(')', ' ').split()
+    names = tokens[0::2]
+
+    assert len(tokens) % 2 == 0 and content.count('(') == len(names) + 1, \
+        "counterexample should be a list of (name value) pairs"
+
+    values = np.array(tokens[1::2], dtype=float)
+
+    # usual layout: all X values, then all Y values
+    num_x = content.count('X_')
+
+    if names[:num_x] == get_ce_names('X', num_x) and names[num_x:] == get_ce_names('Y', len(names) - num_x):
+        return values[:num_x], values[num_x:]
+
+    is_x = np.array([name.startswith('X_') for name in names], dtype=bool)
+
+    x_names = list(itertools.compress(names, is_x))
+    y_names = list(itertools.compress(names, ~is_x))
+
+    assert x_names == get_ce_names('X', len(x_names)), "X values should be named X_0, X_1, ... in order"
+    assert y_names == get_ce_names('Y', len(y_names)), "Y values should be named Y_0, Y_1, ... in order"
+
+    return values[is_x], values[~is_x]
+
+@functools.lru_cache(maxsize=16)
+def get_ce_names(prefix, count):
+    """get the list of names [prefix_0, prefix_1, ...], cached since most networks have many counterexamples"""
+
+    return [f"{prefix}_{i}" for i in range(count)]
+
+def get_verdict_key(onnx_filename, vnnlib_filename, content, tol):
+    """get the key for a counterexample in the verdict store"""
+
+    ce_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    return file_sha256(onnx_filename), file_sha256(vnnlib_filename), ce_hash, tol
+
+def get_input_hash(x_list):
+    """get the hash of counterexample input values, used with the onnx file hash to memoize network outputs"""
+
+    return hashlib.sha256(np.asarray(x_list, dtype=np.float64).tobytes()).hexdigest()
+
+def get_ce_diff(onnx_filename, vnnlib_filename, ce_path, tol, reverify=False):
+    """get difference in execution
+
+    the verdict is looked up in (and saved to) the verdict store, unless reverify is True"""
 
     content = read_ce_file(ce_path)
 
@@ -112,125 +298,205 @@ def get_ce_diff(onnx_filename, vnnlib_filename, ce_path, tol):
         return CounterexampleResult.NO_CE, f"Note: no counter example provided in {ce_path}"
 
     #print(f"CE CONTENT:\n{content}")
-    
-    assert content[0] == '(' and content[-1] == ')'
-    content = content[1:-1]
 
-    x_list = []
-    y_list = []
+    store = get_verdict_store()
+    key = get_verdict_key(onnx_filename, vnnlib_filename, content, tol)
+    stored = None if reverify else store.get(key)
+    profiling.count("verdict_store_hits" if stored is not None else "verdict_store_misses")
+
+    if stored is not None:
+        return tuple(stored)
+
+    x_list, y_list = parse_ce(content)
+
+    res, msg, stage = check_ce_batch(onnx_filename, [(vnnlib_filename, x_list, y_list)], tol, reverify)[0]
+    store.put(key, res, msg, ce_path, stage)
+
+    return res, msg
+
+def check_ce_batch(onnx_filename, items, tol, reverify=False):
+    """check several parsed counterexamples of the same network, cheap checks first
+
+    items is a list of (vnnlib_filename, x_list, y_list). First X is checked against the input box and Y from the
+    file against the output spec, for all counterexamples of the same vnnlib file at once. Only the ones that pass
+    both are executed, in chunks of Settings.CE_BATCH_SIZE, and their outputs compared to Y, so the network is not
+    loaded at all if every counterexample is rejected early. Networks with a fixed batch dimension are executed
+    one counterexample at a time.
+
+    Network outputs are memoized in the verdict store by the hashes of the onnx file and of the input values, so
+    an input that several tools submitted, or that was executed in an earlier run, is not executed again. If
+    reverify is True, stored outputs are ignored and replaced, so every distinct input is executed once.
+
+    A counterexample that fails a spec check is SPEC_NOT_VIOLATED, even if its Y also doesn't match the network.
 
-    parts = content.split(')')
-    for part in parts:
-        part = part.strip()
-                
-        if not part:
+    returns a list of (CounterexampleResult element, message, ValidationStage element)"""
+
+    rv = [None] * len(items)
+    vnnlib_to_indices = defaultdict(list)
+
+    for index, (vnnlib_filename, _x_list, _y_list) in enumerate(items):
+        vnnlib_to_indices[vnnlib_filename].append(index)
+
+    # list of (index, spec message) of the counterexamples that need to be executed
+    pending = []
+
+    for vnnlib_filename, indices in vnnlib_to_indices.items():
+        checked = check_ce_specs(vnnlib_filename, [items[i][1] for i in indices], [items[i][2] for i in indices], tol)
+
+        for index, (stage, msg) in zip(indices, checked):
+            if stage is None:
+                pending.append((index, msg))
+            else:
+                rv[index] = (CounterexampleResult.SPEC_NOT_VIOLATED, msg, stage)
+                profiling.count(f"ce_rejected_{stage}")
+
+    if not pending:
+        return rv
+
+    pending.sort()
+    store = get_verdict_store()
+    onnx_hash = file_sha256(onnx_filename)
+
+    input_hashes = [get_input_hash(items[index][1]) for index, _ in pending]
+
+    outputs = {} # maps input hash -> flattened network output
+    to_execute = {} # maps input hash -> input values, for inputs without a stored output
+
+    for (index, _), input_hash in zip(pending, input_hashes):
+        x_list = items[index][1]
+
+        if input_hash in outputs or input_hash in to_execute:
             continue
-        
-        assert part[0] == '('
-        part = part[1:]
 
-        name, num = part.split(' ')
-        assert name[0:2] in ['X_', 'Y_']
+        flat_out = None if reverify else store.get_output((onnx_hash, input_hash))
 
-        if name[0:2] == 'X_':
-            assert int(name[2:]) == len(x_list)
-            x_list.append(float(num))
+        if flat_out is not None:
+            outputs[input_hash] = flat_out
         else:
-            assert int(name[2:]) == len(y_list)
-            y_list.append(float(num))
+            to_execute[input_hash] = x_list
 
-    onnx_model = onnx.load(onnx_filename) 
+    if to_execute:
+        model = get_model(onnx_filename)
+        chunk_size = Settings.CE_BATCH_SIZE if model.dynamic_batch else 1
+        execute_list = list(to_execute.items())
 
-    inp, _out, input_dtype = get_io_nodes(onnx_model)
-    input_shape = tuple(d.dim_value if d.dim_value != 0 else 1 for d in inp.type.tensor_type.shape.dim)
+        for start in range(0, len(execute_list), chunk_size):
+            chunk = execute_list[start:start + chunk_size]
+            chunk_outputs = predict_batch(model, [x_list for _, x_list in chunk])
 
-    x_in = np.array(x_list, dtype=input_dtype)
-    flatten_order = 'C'
-    x_in = x_in.reshape(input_shape, order=flatten_order)
-    output = predict_with_onnxruntime(onnx_model, x_in)
+            executed = [((onnx_hash, input_hash), flat_out) for (input_hash, _), flat_out in zip(chunk, chunk_outputs)]
+            store.put_outputs(executed)
+            outputs.update((key[1], flat_out) for key, flat_out in executed)
+
+    num_saved = len(pending) - len(to_execute)
+    profiling.count("ce_executed", len(to_execute))
+    profiling.count("ce_executions_saved", num_saved)
 
-    flat_out = output.flatten(flatten_order)
+    if num_saved > 0:
+        print(f"Inference memo: {num_saved} of {len(pending)} network executions saved for {onnx_filename}")
 
-    expected_y = np.array(y_list)
-    diff = np.linalg.norm(flat_out - expected_y, ord=np.inf)
+    for (index, spec_msg), input_hash in zip(pending, input_hashes):
+        expected_y = np.array(items[index][2])
+        diff = np.linalg.norm(outputs[input_hash] - expected_y, ord=np.inf)
 
-    #return diff, tuple(x_list), tuple(y_list)
+        msg = f"L-inf norm difference between onnx execution and CE file output: {diff} (limit: {tol})"
 
-    #diff, x_tup, y_tup = res
+        if diff > tol:
+            rv[index] = (CounterexampleResult.EXEC_DOESNT_MATCH, msg, ValidationStage.EXECUTION)
+        else:
+            rv[index] = (CounterexampleResult.CORRECT, msg + "\n" + spec_msg, ValidationStage.EXECUTION)
 
-    msg = f"L-inf norm difference between onnx execution and CE file output: {diff} (limit: {tol})"
-    rv = CounterexampleResult.CORRECT
+    return rv
 
-    if diff > tol:
-        rv = CounterexampleResult.EXEC_DOESNT_MATCH
-    else:
-        # output matched onnxruntime, also need to check that the spec file was obeyed
-        is_vio, msg2 = is_specification_vio(onnx_filename, vnnlib_filename, tuple(x_list), tuple(y_list), tol)
+def check_ce_specs(vnnlib_filename, x_lists, y_lists, tol):
+    """the cheap checks of check_ce_batch(): is each X in the input set of the spec, and does each Y violate it?
+
+    returns a list of (stage, msg), where stage is the ValidationStage element of the failed check or None"""
+
+    in_box, vio_list = check_spec_batch(vnnlib_filename, x_lists, y_lists, tol)
 
-        msg += "\n" + msg2
+    rv = []
 
-        if not is_vio:
+    for k, (is_vio, msg) in enumerate(vio_list):
+        if not in_box[k]:
+            msg += "\nNote: counterexample input X was outside of the input set of the specification and so " + \
+                   "was invalid!"
+            rv.append((ValidationStage.INPUT_BOX, msg))
+        elif not is_vio:
             msg += "\nNote: counterexample in file did not violate the specification and so was invalid!"
-            rv = CounterexampleResult.SPEC_NOT_VIOLATED
+            rv.append((ValidationStage.OUTPUT_SPEC, msg))
+        else:
+            rv.append((None, msg))
 
-    return rv, msg
+    return rv
 
-@cachier(stale_after=datetime.timedelta(days=7))
-def is_specification_vio(onnx_filename, vnnlib_filename, x_list, expected_y, tol):
+def is_specification_vio(vnnlib_filename, x_list, expected_y, tol):
     """check that the spec file was obeyed"""
 
-    msg = "Checking if spec was actually violated"
-    onnx_model = onnx.load(onnx_filename) 
+    return is_specification_vio_batch(vnnlib_filename, [x_list], [expected_y], tol)[0]
 
-    inp, out, _ = get_io_nodes(onnx_model)
+def is_specification_vio_batch(vnnlib_filename, x_lists, expected_ys, tol):
+    """check several counterexamples against the same spec file at once, returns a list of (is_vio, msg)"""
 
-    inp_shape = tuple(d.dim_value if d.dim_value != 0 else 1 for d in inp.type.tensor_type.shape.dim)
-    out_shape = tuple(d.dim_value if d.dim_value != 0 else 1 for d in out.type.tensor_type.shape.dim)
+    return check_spec_batch(vnnlib_filename, x_lists, expected_ys, tol)[1]
 
-    num_inputs = 1
-    num_outputs = 1
+@profiled("check_spec")
+def check_spec_batch(vnnlib_filename, x_lists, expected_ys, tol):
+    """is_specification_vio_batch(), also returning whether each X is in the input set of the spec
 
-    for n in inp_shape:
-        num_inputs *= n
+    returns a bool array in_box and a list of (is_vio, msg)
 
-    for n in out_shape:
-        num_outputs *= n
+    box containment for all boxes and the rows of all disjuncts are evaluated with a few numpy operations
+    (see SpecEvaluator). A spec with several disjunctions is violated if each of them is, so they are checked
+    one at a time instead of expanding them. For each one, the messages list the boxes in order until the first
+    violated disjunct is found.
 
-    box_spec_list = read_vnnlib_simple(vnnlib_filename, num_inputs, num_outputs)
+    The number of inputs and outputs is taken from the counterexamples, so the network doesn't need to be loaded.
+    If they don't match the network, executing it on the counterexamples fails later on."""
 
-    rv = False
+    x_batch = np.array(x_lists, dtype=float).reshape(len(x_lists), -1)
+    y_batch = np.array(expected_ys, dtype=float).reshape(len(expected_ys), -1)
 
-    for i, box_spec in enumerate(box_spec_list):
-        input_box, spec_list = box_spec
-        assert len(input_box) == len(x_list), f"input box len: {len(input_box)}, x_in len: {len(x_list)}"
+    spec = get_spec_evaluator(vnnlib_filename, x_batch.shape[1], y_batch.shape[1])
+    term_box, factor_ranges = spec.term_box, spec.factor_ranges
 
-        inside_input_box = True
+    inside = spec.get_inside(x_batch, tol)
+    in_box = spec.get_contained(inside)
+    term_sat = spec.get_term_sat(y_batch, tol)
 
-        for (lb, ub), x in zip(input_box, x_list):
-            if x < lb - tol or x > ub + tol:
-                inside_input_box = False
-                break
+    rv = []
+
+    for k in range(len(x_batch)):
+        msg = "Checking if spec was actually violated"
+        is_vio = True
 
-        if inside_input_box:
-            msg += f"\nCE input X was inside box #{i}"
-            
-            # check spec
-            violated = False
-                
-            for j, (prop_mat, prop_rhs) in enumerate(spec_list):
-                vec = prop_mat.dot(expected_y)
-                sat = np.all(vec <= prop_rhs + tol)
-
-                if sat:
-                    msg += f"\nprop #{j} violated:\n{vec - prop_rhs}"
-                    violated = True
+        for f, (box_start, box_end, _, _) in enumerate(factor_ranges):
+            if len(factor_ranges) > 1:
+                msg += f"\nDisjunction #{f}:"
+
+            factor_vio = False
+
+            for i in np.nonzero(inside[k, box_start:box_end])[0] + box_start:
+                msg += f"\nCE input X was inside box #{i - box_start}"
+
+                sat_terms = np.nonzero((term_box == i) & term_sat[k])[0]
+
+                if len(sat_terms) > 0:
+                    t = sat_terms[0]
+                    term = spec.get_term(t)
+                    vec = term.dot(y_batch[k:k + 1])[0]
+
+                    msg += f"\nprop #{np.count_nonzero(term_box[:t] == i)} violated:\n{vec - term.rhs}"
+                    factor_vio = True
                     break
 
-            if violated:
-                rv = True
+            if not factor_vio:
+                is_vio = False
                 break
-                
-    return rv, msg
+
+        rv.append((is_vio, msg))
+
+    return in_box, rv
 
 def test():
     """test code"""
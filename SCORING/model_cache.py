@@ -0,0 +1,108 @@
+'''
+process-wide cache of onnx models and their onnxruntime sessions
+
+Deserializing a network and initializing an InferenceSession is expensive for the large benchmarks, and many
+counterexamples usually share one network. Models are cached per process keyed by path and modification time,
+and the least recently used ones are evicted once the cached onnx files exceed Settings.ONNX_CACHE_MAX_BYTES.
+'''
+
+from collections import OrderedDict
+from pathlib import Path
+
+import onnx
+import onnxruntime as ort
+
+from vnnlib import get_io_nodes
+import profiling
+from settings import Settings
+
+class CachedModel:
+    '''an onnx model together with its inference session and input / output information'''
+
+    def __init__(self, onnx_filename, mtime, nbytes):
+        self.onnx_filename = onnx_filename
+        self.mtime = mtime
+        self.nbytes = nbytes
+
+        with profiling.span("load_onnx_model"):
+            self.onnx_model = onnx.load(onnx_filename)
+            self.sess = ort.InferenceSession(self.onnx_model.SerializeToString())
+
+        self.inp, self.out, self.input_dtype = get_io_nodes(self.onnx_model, self.sess)
+
+        self.input_shape = tuple(d.dim_value if d.dim_value != 0 else 1 for d in self.inp.type.tensor_type.shape.dim)
+        self.output_shape = tuple(d.dim_value if d.dim_value != 0 else 1 for d in self.out.type.tensor_type.shape.dim)
+
+        # can several inputs be stacked along the first dimension?
+        batch_dim = self.inp.type.tensor_type.shape.dim[0]
+        self.dynamic_batch = len(self.input_shape) > 1 and (batch_dim.dim_param != '' or batch_dim.dim_value == 0)
+
+        self.num_inputs = 1
+        self.num_outputs = 1
+
+        for n in self.input_shape:
+            self.num_inputs *= n
+
+        for n in self.output_shape:
+            self.num_outputs *= n
+
+class ModelCache:
+    '''LRU cache of CachedModel objects, limited by the total size of the cached onnx files'''
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.models = OrderedDict() # maps resolved path -> CachedModel, least recently used first
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, onnx_filename):
+        'get the CachedModel for the given onnx file, loading it if needed'
+
+        path = str(Path(onnx_filename).resolve())
+        stat = Path(path).stat()
+
+        model = self.models.get(path)
+
+        if model is not None and model.mtime == stat.st_mtime_ns:
+            self.hits += 1
+            profiling.count("model_cache_hits")
+            self.models.move_to_end(path)
+            return model
+
+        if model is not None:
+            # file changed on disk
+            self._remove(path)
+
+        self.misses += 1
+        profiling.count("model_cache_misses")
+        model = CachedModel(path, stat.st_mtime_ns, stat.st_size)
+
+        self.models[path] = model
+        self.total_bytes += model.nbytes
+
+        # evict least recently used, but always keep the model that was just loaded
+        while self.total_bytes > self.max_bytes and len(self.models) > 1:
+            self._remove(next(iter(self.models)))
+
+        return model
+
+    def _remove(self, path):
+        'remove a model from the cache'
+
+        model = self.models.pop(path)
+        self.total_bytes -= model.nbytes
+
+    def clear(self):
+        'remove all cached models'
+
+        self.models.clear()
+        self.total_bytes = 0
+
+_model_cache = ModelCache(Settings.ONNX_CACHE_MAX_BYTES)
+
+def get_model(onnx_filename):
+    'get the (cached) CachedModel for an onnx file'
+
+    return _model_cache.get(onnx_filename)
@@ -6,14 +6,110 @@ Stanley Bak
 
 from typing import Dict, List, Tuple, Union
 
+import io
+import os
+import sys
+import json
+import hashlib
+import tempfile
+import gzip
+import argparse
+import itertools
+import copy
 import glob
 import csv
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from collections import defaultdict
 import numpy as np
 
-from counterexamples import is_correct_counterexample, CounterexampleResult
+from counterexamples import check_counterexamples_parallel, CounterexampleResult
+from benchmark_files import get_benchmark_filenames
+from vnnlib import file_sha256
 from settings import Settings
+import profiling
+from profiling import profiled
+
+def open_csv(csv_path):
+    """open a results csv file for reading, which may be gzip compressed (.gz)"""
+
+    if str(csv_path).endswith(".gz"):
+        return gzip.open(csv_path, 'rt', newline='')
+
+    return open(csv_path, newline='')
+
+def get_csv_list():
+    """get the sorted list of results csv files, using Settings.CSV_GLOB and a .gz version of each
+
+    if a tool has both results.csv and results.csv.gz, the uncompressed file is used"""
+
+    csv_list = glob.glob(Settings.CSV_GLOB)
+
+    for gz_path in glob.glob(Settings.CSV_GLOB + ".gz"):
+        if gz_path[:-3] not in csv_list:
+            csv_list.append(gz_path)
+
+    csv_list.sort()
+
+    return csv_list
+
+class ResultCode:
+    """integer codes for the normalized result column"""
+
+    HOLDS = 0
+    VIOLATED = 1
+    TIMEOUT = 2
+    ERROR = 3
+    UNKNOWN = 4
+    UNEXPECTED = 5 # anything else, only allowed in categories that are not scored in the current pass
+
+    NAMES = ("holds", "violated", "timeout", "error", "unknown", "unexpected")
+
+    @staticmethod
+    def from_csv(result):
+        """get the code for a raw result string from a csv file, applying Settings.CSV_SUBSTITUTIONS"""
+
+        result = result.lower()
+
+        for from_prefix, to_str in Settings.CSV_SUBSTITUTIONS:
+            if result == '': # don't use '' as prefix
+                result = 'unknown'
+            elif result.startswith(from_prefix):
+                result = to_str
+
+        if result.startswith('timeout'):
+            result = 'timeout' # fix for verapak "timeout(X_00 ..."
+
+        if result in ResultCode.NAMES[:ResultCode.UNEXPECTED]:
+            return ResultCode.NAMES.index(result)
+
+        return ResultCode.UNEXPECTED
+
+class CategoryResults:
+    """a tool's results in one category, stored as numpy columns
+
+    networks and props are ids into the names list, which is shared by all categories of a tool
+    """
+
+    def __init__(self, names, networks, props, prepare_times, run_times, results, is_test, unexpected_results):
+        self.names = names
+        self.networks = networks
+        self.props = props
+        self.prepare_times = prepare_times
+        self.run_times = run_times # raw times, or times after overhead subtraction, see ToolResult.load()
+        self.results = results # ResultCode values
+        self.is_test = is_test # test_nano / test_tiny instances, which are used for the overhead but not scored
+        self.unexpected_results = unexpected_results # set of raw strings that were coded as UNEXPECTED
+
+    def __len__(self):
+        return len(self.results)
+
+    def select(self, mask, results, run_times):
+        """get a CategoryResults with the rows in mask, using the given full-length results and run_times"""
+
+        return CategoryResults(self.names, self.networks[mask], self.props[mask], self.prepare_times[mask],
+                               run_times[mask], results[mask], self.is_test[mask], self.unexpected_results)
 
 class ToolResult:
     """Tool's result"""
@@ -26,22 +122,14 @@ class ToolResult:
     RESULT = 4
     RUN_TIME = 5
 
-    all_categories = set()
-
-    # stats
-    num_verified = defaultdict(int) # number of benchmarks verified
-    num_violated = defaultdict(int) 
-    num_holds = defaultdict(int)
-    incorrect_results = defaultdict(int)
-
-    num_categories = defaultdict(int)
-    toolerror_counts = defaultdict(int)
+    def __init__(self, scored, tool_name, csv_path, cpu_benchmarks, skip_benchmarks, csv_table=None):
+        """csv_table is the result of load_csv(csv_path), which can be shared between ToolResult objects.
+        It is loaded from csv_path if not given."""
 
-    def __init__(self, scored, tool_name, csv_path, cpu_benchmarks, skip_benchmarks):
         assert "csv" in csv_path
 
         self.tool_name = tool_name
-        self.category_to_list = defaultdict(list) # maps category -> list of results
+        self.category_to_results: Dict[str, CategoryResults] = {}
 
         self.skip_benchmarks = skip_benchmarks
         self.cpu_benchmarks = cpu_benchmarks
@@ -50,114 +138,177 @@ class ToolResult:
         
         self.max_prepare = 0.0
 
-        self.load(scored, csv_path)
+        if csv_table is None:
+            csv_table = ToolResult.load_csv(csv_path)
 
-    @staticmethod
-    def reset():
-        """reset static variables"""
+        self.load(scored, csv_table)
 
-        ToolResult.all_categories = set()
+    def result_instance_str(self, cat, index):
+        """get a string representation of the instance for the given category and index"""
 
-        # stats
-        ToolResult.num_verified = defaultdict(int) # number of benchmarks verified
-        ToolResult.num_violated = defaultdict(int) 
-        ToolResult.num_holds = defaultdict(int)
-        ToolResult.incorrect_results = defaultdict(int)
+        cat_results = self.category_to_results[cat]
 
-        ToolResult.num_categories = defaultdict(int)
+        net = cat_results.names[cat_results.networks[index]]
+        prop = cat_results.names[cat_results.props[index]]
 
-        ToolResult.toolerror_counts = defaultdict(int)
+        return Path(net).stem + "-" + Path(prop).stem
 
-    def result_instance_str(self, cat, index):
-        """get a string representation of the instance for the given category and index"""
+    def counterexample_tuple(self, cat, index):
+        """get the (ce_path, cat, net, prop) tuple used to check the counterexample for the given instance"""
 
-        row = self.category_to_list[cat][index]
+        cat_results = self.category_to_results[cat]
+        net = Path(cat_results.names[cat_results.networks[index]]).stem
+        prop = Path(cat_results.names[cat_results.props[index]]).stem
 
-        net = row[ToolResult.NETWORK]
-        prop = row[ToolResult.PROP]
+        ce_path = f"../{self.tool_name}/{cat}/{net}_{prop}.counterexample.gz"
 
-        return Path(net).stem + "-" + Path(prop).stem
+        return ce_path, cat, net, prop
 
     def single_result(self, cat, index):
         """get result_str, runtime of tool, after subtracting overhead"""
 
-        row = self.category_to_list[cat][index]
+        cat_results = self.category_to_results[cat]
 
-        res = row[ToolResult.RESULT]
-        t = float(row[ToolResult.RUN_TIME])
+        res = ResultCode.NAMES[cat_results.results[index]]
+        t = float(cat_results.run_times[index])
 
-        t -= self.cpu_overhead if cat in self.cpu_benchmarks else self.gpu_overhead
-
-        # prevent 0 times as this messes up log plots
-        t = max(Settings.PLOT_MIN_TIME, t)
+        if t <= Settings.PLOT_MIN_TIME:
+            # use the setting itself, as it may be an int, which prints differently
+            t = Settings.PLOT_MIN_TIME
 
         return res, t
 
-    def load(self, scored, csv_path):
-        """load data from file"""
-
+    @staticmethod
+    @profiled("load_csv")
+    def load_csv(csv_path):
+        """read a results csv file (optionally gzip compressed) into a dict mapping each category to a
+        CategoryResults with all of its rows
+
+        rows are read Settings.CSV_CHUNK_ROWS at a time and converted to numpy columns right away, so memory
+        doesn't depend on the size of the raw row text. Result strings are normalized into ResultCode values
+        once per distinct string, and network and property names are interned."""
+
+        names = []
+        name_ids = {}
+        result_codes = {}
         unexpected_results = set()
-                
-        with open(csv_path, newline='') as csvfile:
-            for row in csv.reader(csvfile):
-                # rename results
-                
-                #print(f"{csv_path}: {row}")
-                
-                row[ToolResult.RESULT] = row[ToolResult.RESULT].lower()
-
-                substitutions = Settings.CSV_SUBSTITUTIONS
-
-                for from_prefix, to_str in substitutions:
-                    if row[ToolResult.RESULT] == '': # don't use '' as prefix
-                        row[ToolResult.RESULT] = 'unknown'
-                    elif row[ToolResult.RESULT].startswith(from_prefix):
-                        row[ToolResult.RESULT] = to_str
-
-                network = row[ToolResult.NETWORK]
-                result = row[ToolResult.RESULT]
-                cat = row[ToolResult.CATEGORY]
-                prepare_time = float(row[ToolResult.PREPARE_TIME])
-                run_time = float(row[ToolResult.RUN_TIME])
-
-                # workaround to drop convBigRELU from cifar2020
-                if cat == 'cifar2020':
-                    if 'convBigRELU' in network:
-                        result = row[ToolResult.RESULT] = "unknown"
-
-                if cat in self.skip_benchmarks or \
-                        (scored and cat in Settings.UNSCORED_CATEGORIES) or \
-                        (not scored and cat not in Settings.UNSCORED_CATEGORIES):
-                    result = row[ToolResult.RESULT] = "unknown"
-
-                if result.startswith('timeout'):
-                    result = 'timeout' # fix for verapak "timeout(X_00 ..."
-
-                if not ("test_nano" in network or "test_tiny" in network):
-                    self.category_to_list[cat].append(row)
-
-                if result not in ["holds", "violated", "timeout", "error", "unknown"]:
-                    unexpected_results.add(result)
-                    print(f"Unexpected results: {unexpected_results}")
-                    exit(1)
-
-                if result in ["holds", "violated"]:
-                    if cat in self.cpu_benchmarks:
-                        self.cpu_overhead = min(self.cpu_overhead, run_time)
-                    else:
-                        self.gpu_overhead = min(self.gpu_overhead, run_time)
-                        
-                    self.max_prepare = max(self.max_prepare, prepare_time)
 
-        assert not unexpected_results, f"Unexpected results: {unexpected_results}"
+        # maps category -> list of chunks, each a tuple of columns: network, prop, prepare_time, run_time,
+        # result, is_test
+        cat_chunks = {}
+
+        def intern(name):
+            rv = name_ids.get(name)
+
+            if rv is None:
+                rv = name_ids[name] = len(names)
+                names.append(name)
+
+            return rv
+
+        def get_code(cat, network, result):
+            code = result_codes.get(result)
+
+            if code is None:
+                code = result_codes[result] = ResultCode.from_csv(result)
+
+                if code == ResultCode.UNEXPECTED:
+                    unexpected_results.add(result.lower())
+
+            # workaround to drop convBigRELU from cifar2020
+            if cat == 'cifar2020' and 'convBigRELU' in network:
+                code = ResultCode.UNKNOWN
+
+            return code
+
+        with open_csv(csv_path) as csvfile:
+            reader = csv.reader(csvfile)
+
+            while True:
+                chunk = list(itertools.islice(reader, Settings.CSV_CHUNK_ROWS))
+
+                if not chunk:
+                    break
+
+                chunk_rows = defaultdict(list)
+
+                for row in chunk:
+                    chunk_rows[row[ToolResult.CATEGORY]].append(row)
+
+                del chunk
+
+                for cat, rows in chunk_rows.items():
+                    networks = [row[ToolResult.NETWORK] for row in rows]
+
+                    columns = (np.array([intern(n) for n in networks], dtype=np.int32),
+                               np.array([intern(row[ToolResult.PROP]) for row in rows], dtype=np.int32),
+                               np.array([row[ToolResult.PREPARE_TIME] for row in rows], dtype=float),
+                               np.array([row[ToolResult.RUN_TIME] for row in rows], dtype=float),
+                               np.array([get_code(cat, n, row[ToolResult.RESULT]) for n, row in zip(networks, rows)],
+                                        dtype=np.int8),
+                               np.array(["test_nano" in n or "test_tiny" in n for n in networks], dtype=bool))
+
+                    cat_chunks.setdefault(cat, []).append(columns)
+
+        rv = {}
+
+        for cat, chunks in cat_chunks.items():
+            columns = [np.concatenate(c) for c in zip(*chunks)]
+            rv[cat] = CategoryResults(names, *columns, unexpected_results)
+
+        return rv
+
+    @profiled("load_results")
+    def load(self, scored, csv_table):
+        """load data from the table returned by load_csv, keeping only the categories for this pass
+
+        csv_table is not modified, so it can be shared between the scored and unscored passes. Overhead is
+        subtracted from the run times here, once for each category."""
+
+        cat_results_list = []
+
+        for cat, cat_results in csv_table.items():
+            results = cat_results.results
+
+            if cat in self.skip_benchmarks or \
+                    (scored and cat in Settings.UNSCORED_CATEGORIES) or \
+                    (not scored and cat not in Settings.UNSCORED_CATEGORIES):
+                results = np.full(len(results), ResultCode.UNKNOWN, dtype=np.int8)
+
+            if np.any(results == ResultCode.UNEXPECTED):
+                print(f"Unexpected results: {cat_results.unexpected_results}")
+                exit(1)
+
+            solved = (results == ResultCode.HOLDS) | (results == ResultCode.VIOLATED)
+
+            if np.any(solved):
+                min_time = np.min(cat_results.run_times[solved])
+
+                if cat in self.cpu_benchmarks:
+                    self.cpu_overhead = min(self.cpu_overhead, min_time)
+                else:
+                    self.gpu_overhead = min(self.gpu_overhead, min_time)
+
+                self.max_prepare = max(self.max_prepare, np.max(cat_results.prepare_times[solved]))
+
+            if not np.all(cat_results.is_test):
+                cat_results_list.append((cat, cat_results, results))
 
         print(f"Loaded {self.tool_name}, default-overhead (gpu): {round(self.gpu_overhead, 1)}s," + \
               f"cpu-overhead: {round(self.cpu_overhead, 1)}s, " + \
               f"prepare time: {round(self.max_prepare, 1)}s")
 
+        for cat, cat_results, results in cat_results_list:
+            run_times = cat_results.run_times - (self.cpu_overhead if cat in self.cpu_benchmarks else self.gpu_overhead)
+
+            # prevent 0 times as this messes up log plots
+            run_times = np.maximum(Settings.PLOT_MIN_TIME, run_times)
+
+            self.category_to_results[cat] = cat_results.select(~cat_results.is_test, results, run_times)
+
         for skip_benchmark in self.skip_benchmarks:
-            assert skip_benchmark in self.category_to_list, f"skip benchmark '{skip_benchmark}' not found in cat " + \
-                f"list: {list(self.category_to_list.keys())}"
+            assert skip_benchmark in self.category_to_results, f"skip benchmark '{skip_benchmark}' not found " + \
+                f"in cat list: {list(self.category_to_results.keys())}"
 
         self.delete_empty_categories()
 
@@ -166,246 +317,152 @@ class ToolResult:
 
         to_remove = [] #['acasxu', 'cifar2020'] # benchmarks to skip
 
-        for key in self.category_to_list.keys():
-            rows = self.category_to_list[key]
+        for key, cat_results in self.category_to_results.items():
+            results = cat_results.results
 
-            should_remove = True
-
-            for row in rows:
-                result = row[ToolResult.RESULT]
-
-                if result in ('holds', 'violated'):
-                    
-                    should_remove = False
-                    break
+            should_remove = not np.any((results == ResultCode.HOLDS) | (results == ResultCode.VIOLATED))
 
             if should_remove:
                 to_remove.append(key)
-            elif key != "test":
-                ToolResult.all_categories.add(key)
 
         for key in to_remove:
-            if key in self.category_to_list:
+            if key in self.category_to_results:
                 #print(f"empty category {key} in tool {self.tool_name}")
-                del self.category_to_list[key]
+                del self.category_to_results[key]
 
-        ToolResult.num_categories[self.tool_name] = len(self.category_to_list)
+def get_all_categories(result_list):
+    """get the set of categories that have results from at least one tool"""
 
-class LongTableRow:
-    """container object for longtable of results"""
+    rv = set()
 
-    def __init__(self, cat: str, instance_id: int, result: str, tool_times_scores: Dict[str, Tuple[Union[str, float], int]]):
-        self.cat = cat
-        self.instance_id = instance_id
+    for t in result_list:
+        rv.update(cat for cat in t.category_to_results if cat != "test")
 
-        assert result in ['sat', 'unsat', '-'], f"result was {result}"
-        self.result = result
-        self.tool_times_scores = tool_times_scores
+    return rv
 
-def compare_results(all_tool_names, gnuplot_tool_cat_times, result_list, single_overhead, scored):
-    """compare results across tools"""
+class ScoringStats:
+    """per-tool counts collected while scoring, used by print_stats
 
-    min_percent = 0 # minimum percent for total score
+    Stats from separate categories (possibly scored in other processes) are combined with merge(), where
+    the counts of each tool add up, so the totals don't depend on the order.
+    """
 
-    total_score = defaultdict(int)
-    all_cats = {}
+    NAMES = ('num_categories', 'num_verified', 'num_violated', 'num_holds', 'incorrect_results', 'toolerror_counts')
 
-    tool_times = {}
+    def __init__(self):
+        self.num_categories = defaultdict(int) # number of categories with results
+        self.num_verified = defaultdict(int) # number of benchmarks verified
+        self.num_violated = defaultdict(int)
+        self.num_holds = defaultdict(int)
+        self.incorrect_results = defaultdict(int)
+        self.toolerror_counts = defaultdict(int) # maps tool_name + '_' + error type -> count
 
-    longtable_data: List[LongTableRow] = []
+    def merge(self, other):
+        """add the counts from another ScoringStats into this one, returns self"""
 
-    for tool in all_tool_names:
-        tool_times[tool] = []
+        for name in ScoringStats.NAMES:
+            counts = getattr(self, name)
 
-    for cat in sorted(ToolResult.all_categories):
-        print(f"\nCategory {cat}:")
+            for key, count in getattr(other, name).items():
+                counts[key] += count
 
-        # maps tool_name -> [score, num_verified, num_falsified, num_fastest, num_errors]
-        cat_score: Dict[str, List[int, int, int, int, int]] = {}
-        all_cats[cat] = cat_score
+        return self
 
-        num_rows = 0
+    def to_json(self):
+        """get a json-compatible dict"""
 
-        participating_tools = []
+        return {name: dict(getattr(self, name)) for name in ScoringStats.NAMES}
 
-        for tool_result in result_list:
-            cat_dict = tool_result.category_to_list
+    @staticmethod
+    def from_json(d):
+        """create from the result of to_json()"""
 
-            if not cat in cat_dict:
-                continue
-            
-            rows = cat_dict[cat]
-            assert num_rows == 0 or len(rows) == num_rows, f"tool {tool_result.tool_name}, cat {cat}, " + \
-                f"got {len(rows)} rows expected {num_rows}"
-
-            if num_rows == 0:
-                num_rows = len(rows)
-                print(f"Category {cat} has {num_rows} (from {tool_result.tool_name})")
-
-            participating_tools.append(tool_result)
-
-        # work with participating tools only
-        tool_names = [t.tool_name for t in participating_tools]
-        print(f"{len(participating_tools)} participating tools: {tool_names}")
-        table_rows = []
-        all_times = []
-        all_results = []
-
-        for index in range(num_rows):
-            rand_gen_succeeded = False
-            times_holds = []
-            tools_holds = []
-            times_violated = []
-            tools_violated = []
-            counterexamples_violated = []
-            correct_violations = {}
-            
-            table_row = []
-            table_rows.append(table_row)
-            instance_str = participating_tools[0].result_instance_str(cat, index)
-            table_row.append(instance_str)
+        rv = ScoringStats()
 
-            for t in participating_tools:
-                res, secs = t.single_result(cat, index)
+        for name in ScoringStats.NAMES:
+            getattr(rv, name).update(d[name])
 
-                if res == "unknown":
-                    table_row.append("-")
-                    continue
+        return rv
 
-                if not res in ["holds", "violated"]:
-                    table_row.append(res)
-                    continue
+class LongTableRow:
+    """container object for longtable of results"""
 
-                if res == "holds":
-                    times_holds.append(secs)
-                    tools_holds.append(t.tool_name)
-                else:
-                    assert res == "violated"
-                    times_violated.append(secs)
-                    tools_violated.append(t.tool_name)
+    def __init__(self, cat: str, instance_id: int, result: str, tool_times_scores: Dict[str, Tuple[Union[str, float], int]]):
+        self.cat = cat
+        self.instance_id = instance_id
 
-                    # construct counterexample path
-                    row = t.category_to_list[cat][index]
-                    net = Path(row[ToolResult.NETWORK]).stem
-                    prop = Path(row[ToolResult.PROP]).stem
+        assert result in ['sat', 'unsat', '-'], f"result was {result}"
+        self.result = result
+        self.tool_times_scores = tool_times_scores
 
-                    ce_path = f"../{t.tool_name}/{cat}/{net}_{prop}.counterexample.gz"
+class CategoryState:
+    """everything compare_results needs from scoring a single category
 
-                    assert Path(ce_path).is_file(), f"CE path not found: {ce_path}"
-                    tup = ce_path, cat, net, prop
-                    counterexamples_violated.append(tup)
+    In incremental mode (Settings.INCREMENTAL) states are saved to Settings.CATEGORY_STATE_DIR together with
+    a fingerprint of their inputs, and reused in later runs as long as the fingerprint doesn't change.
+    """
 
-                table_row.append(f"{round(secs, 1)} ({res[0]})")
+    # increase when the scoring code changes, to invalidate saved states
+    VERSION = 2
 
-                if t.tool_name == "randgen":
-                    assert res == "violated"
-                    rand_gen_succeeded = True
+    def __init__(self, cat, cat_score, tool_times, longtable_data, stats=None, output=""):
+        self.cat = cat
+        self.cat_score = cat_score # maps tool_name -> [score, num_verified, num_falsified, num_fastest, num_errors]
+        self.tool_times = tool_times # maps tool_name -> times of solved instances, for the cactus plots
+        self.longtable_data = longtable_data
 
-            print()
+        self.stats = stats if stats is not None else ScoringStats()
+        self.output = output # printed output
 
-            true_result = "-"
+    def replay(self, stats):
+        """print the output and merge the category's stats into stats, as if the category was scored now"""
 
-            if times_holds and not times_violated:
-                true_result = 'unsat'
-            elif times_violated and not times_holds:
-                true_result = 'sat'
-            elif times_holds and times_violated:
-                print(f"WARNING: multiple results for index {index}. Violated: {len(times_violated)} " +
-                      f"({tools_violated}), Holds: {len(times_holds)} ({tools_holds})")
-                table_row.append('*multiple results*')
+        print(self.output, end='')
+        stats.merge(self.stats)
 
-                for tup, tool in zip(counterexamples_violated, tools_violated):
-                    print(f"\nchecking counterexample for {tool}")
-                    res = is_correct_counterexample(*tup)
+    def to_json(self):
+        """get a json-compatible dict"""
 
-                    correct_violations[tool] = res
+        longtable_data = [(r.cat, r.instance_id, r.result, r.tool_times_scores) for r in self.longtable_data]
 
-                print(f"were violated counterexamples valid?: {correct_violations}")
+        return {'cat': self.cat, 'cat_score': self.cat_score, 'tool_times': self.tool_times,
+                'longtable_data': longtable_data, 'stats': self.stats.to_json(), 'output': self.output}
 
-                if np.any([x == CounterexampleResult.CORRECT for x in correct_violations.values()]): ### HERE !!
-                    true_result = 'sat'
-                else:
-                    true_result = 'unsat'
+    @staticmethod
+    def from_json(d):
+        """create from the result of to_json()"""
 
-            print(f"Row: {table_row}")
-            print(f"True Result: {true_result}")
+        longtable_data = [LongTableRow(cat, instance_id, result, {tool: tuple(x) for tool, x in scores.items()})
+                          for cat, instance_id, result, scores in d['longtable_data']]
 
-            row_times = []
-            all_times.append(row_times)
-            all_results.append(None)
-            tool_times_scores: Dict[str, Tuple[Union[str, float], int]] = {}
-            
-            for t in participating_tools:
-                res, secs = t.single_result(cat, index)
-                
-                score, is_verified, is_falsified, is_fastest, is_error = get_score(t.tool_name, res, secs, rand_gen_succeeded,
-                                                                times_holds, times_violated,
-                                                                correct_violations)
-                print(f"{index}: {t.tool_name} score: {score}, is_ver: {is_verified}, is_fals: {is_falsified}, " + \
-                      f"is_fastest: {is_fastest}")
-
-                if is_verified or is_falsified:
-                    all_results[-1] = 'H' if is_verified else 'V'
-                    row_times.append(secs)
-                    
-                    tool_times_scores[t.tool_name] = (secs, score)
-                else:
-                    row_times.append(None)
+        return CategoryState(d['cat'], d['cat_score'], d['tool_times'], longtable_data,
+                             ScoringStats.from_json(d['stats']), d['output'])
 
-                    if is_error:
-                        tool_times_scores[t.tool_name] = (secs, score)
+@profiled("compare_results")
+def compare_results(all_tool_names, gnuplot_tool_cat_times, result_list, single_overhead, scored, stats):
+    """compare results across tools, adding the scoring stats to stats"""
 
-                if t.tool_name in cat_score:
-                    tool_score_tup = cat_score[t.tool_name]
-                else:
-                    tool_score_tup = [0, 0, 0, 0, 0]
-                    cat_score[t.tool_name] = tool_score_tup
-
-                # [score, num_verified, num_falsified, num_fastest]
-                tool_score_tup[0] += score
-                tool_score_tup[1] += 1 if is_verified else 0
-                tool_score_tup[2] += 1 if is_falsified else 0
-                tool_score_tup[3] += 1 if is_fastest else 0
-                tool_score_tup[4] += 1 if is_error else 0
-                tool_score_tup = None
-
-            # accumulate long table data
-            longtable_data.append(LongTableRow(cat, index, true_result, tool_times_scores))
-
-        print("--------------------")
-        num_holds = 0
-        num_violated = 0
-        num_unknown = 0
-
-        for i, (row_times, result) in enumerate(zip(all_times, all_results)):
-            assert len(row_times) == len(tool_names)
-
-            if result is None:
-                num_unknown += 1
-            else:                
-                for t, tool in zip(row_times, tool_names):
-                    if t is not None:
-                        #assert t > 0, "time was zero?"
-                        tool_times[tool].append(t)
-                        gnuplot_tool_cat_times[tool][cat].append(t)
-                        gnuplot_tool_cat_times[tool]['all'].append(t)
-                
-                if result == 'V':
-                    num_violated += 1
-                elif result == 'H':
-                    num_holds += 1
-        
-        print(f"Total Violated: {num_violated}")
-        print(f"Total Holds: {num_holds}")
-        print(f"Total Unknown: {num_unknown}")
+    min_percent = 0 # minimum percent for total score
 
-        print("--------------------")
-        print(", ".join(tool_names))
+    total_score = defaultdict(int)
+    all_cats = {}
+
+    longtable_data: List[LongTableRow] = []
 
-        for table_row in table_rows:
-            print(", ".join(table_row))
+    all_categories = get_all_categories(result_list)
+    states = get_category_states(result_list, all_categories)
 
-        print(f"---------\nCategory {cat}:")
+    for cat in sorted(all_categories):
+        state = states[cat]
+        state.replay(stats)
+
+        cat_score = state.cat_score
+        all_cats[cat] = cat_score
+        longtable_data += state.longtable_data
+
+        for tool, times in state.tool_times.items():
+            gnuplot_tool_cat_times[tool][cat] += times
+            gnuplot_tool_cat_times[tool]['all'] += times
 
         if cat_score:
             max_score = max([t[0] for t in cat_score.values()])
@@ -557,6 +614,417 @@ def compare_results(all_tool_names, gnuplot_tool_cat_times, result_list, single_
 
         print_longtable_footer(f)
 
+def get_category_states(result_list, all_categories):
+    """score all categories in all_categories, returns a dict cat -> CategoryState
+
+    in incremental mode, categories whose inputs didn't change since the last run reuse their saved state, and
+    only the disputed counterexamples of the other categories are checked
+    """
+
+    states = {}
+    fingerprints = {}
+    cat_disputed = {}
+
+    for cat in sorted(all_categories):
+        cat_disputed[cat] = get_disputed_counterexamples(result_list, cat)
+
+        if Settings.INCREMENTAL:
+            fingerprints[cat] = category_fingerprint(cat, result_list, cat_disputed[cat])
+
+            if not Settings.CE_REVERIFY:
+                state = load_category_state(cat, fingerprints[cat])
+                profiling.count("category_state_hits" if state is not None else "category_state_misses")
+
+                if state is not None:
+                    states[cat] = state
+
+    to_score = [cat for cat in sorted(all_categories) if cat not in states]
+
+    if Settings.INCREMENTAL:
+        print(f"Incremental: reusing {len(states)} categories, rescoring {len(to_score)}: {to_score}")
+
+    # check all disputed counterexamples up front, spread over a pool of worker processes
+    disputed = []
+
+    for cat in to_score:
+        disputed += cat_disputed[cat]
+
+    print(f"Checking {len(disputed)} disputed counterexamples")
+    ce_results = check_counterexamples_parallel(disputed)
+
+    for state in score_categories_parallel(to_score, result_list, ce_results):
+        states[state.cat] = state
+
+        if Settings.INCREMENTAL:
+            save_category_state(state, fingerprints[state.cat])
+
+    return states
+
+def score_categories_parallel(cats, result_list, ce_results, max_workers=None):
+    """score categories using a pool of worker processes, returns a list of CategoryState in the order of cats
+
+    each worker gets only the given category's rows of the participating tools and its counterexample results.
+    max_workers defaults to Settings.SCORING_NUM_WORKERS
+    """
+
+    if max_workers is None:
+        max_workers = Settings.SCORING_NUM_WORKERS or os.cpu_count()
+
+    max_workers = min(max_workers, len(cats))
+
+    if max_workers <= 1:
+        return [score_category_captured(cat, result_list, ce_results) for cat in cats]
+
+    cat_result_lists = []
+    cat_ce_results = []
+
+    for cat in cats:
+        cat_result_list = []
+
+        for t in result_list:
+            if cat in t.category_to_results:
+                cat_tool = copy.copy(t)
+                cat_tool.category_to_results = {cat: t.category_to_results[cat]}
+                cat_result_list.append(cat_tool)
+
+        cat_result_lists.append(cat_result_list)
+        cat_ce_results.append({tup: ce_results[tup] for tup in get_disputed_counterexamples(cat_result_list, cat)})
+
+    profile = profiling.is_enabled()
+    rv = []
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for state, snapshot in executor.map(_score_category_worker, cats, cat_result_lists, cat_ce_results,
+                                            [profile] * len(cats)):
+            rv.append(state)
+
+            if profile:
+                profiling.get_profiler().merge(snapshot)
+
+    return rv
+
+def _score_category_worker(cat, result_list, ce_results, profile):
+    """process pool entry point, returns the result of score_category_captured and a profiling snapshot"""
+
+    profiling.start_worker(profile)
+    state = score_category_captured(cat, result_list, ce_results)
+
+    return state, profiling.get_profiler().snapshot()
+
+def category_fingerprint(cat, result_list, disputed):
+    """get a hash of everything the scoring of a category depends on
+
+    this covers each participating tool's rows in the category, the disputed counterexample files (by size and
+    modification time), the onnx and vnnlib files of the disputed instances (by contents) and the relevant settings
+    """
+
+    h = hashlib.sha256()
+    h.update(repr((CategoryState.VERSION, cat, Settings.SCORING_MIN_TIME, Settings.COUNTEREXAMPLE_TOL,
+                   Settings.BENCHMARK_REPO)).encode())
+
+    for t in result_list:
+        cat_results = t.category_to_results.get(cat)
+
+        if cat_results is None:
+            continue
+
+        names = cat_results.names
+        instances = [names[net] + "," + names[prop] for net, prop in zip(cat_results.networks, cat_results.props)]
+
+        h.update(t.tool_name.encode())
+        h.update("\n".join(instances).encode())
+        h.update(cat_results.results.tobytes())
+        h.update(cat_results.run_times.tobytes())
+
+    for ce_path, *_ in disputed:
+        try:
+            stat = os.stat(ce_path)
+            h.update(repr((ce_path, stat.st_size, stat.st_mtime_ns)).encode())
+        except FileNotFoundError:
+            h.update(repr((ce_path, None)).encode())
+
+    # the verdicts also depend on the benchmark files, which may be updated or extracted again in place. Hashes of
+    # large files are saved by path, size and modification time, so unchanged networks are not read again
+    for cat_net_prop in sorted({tuple(tup[1:]) for tup in disputed}):
+        onnx_filename, vnnlib_filename = get_benchmark_filenames(*cat_net_prop)
+        h.update(repr((cat_net_prop, file_sha256(onnx_filename), file_sha256(vnnlib_filename))).encode())
+
+    return h.hexdigest()
+
+def load_category_state(cat, fingerprint):
+    """load the saved CategoryState for a category, or None if there is none for the given fingerprint"""
+
+    path = Path(Settings.CATEGORY_STATE_DIR) / f"{cat}.json"
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            d = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if d.get('fingerprint') != fingerprint:
+        return None
+
+    return CategoryState.from_json(d['state'])
+
+def save_category_state(state, fingerprint):
+    """save a CategoryState, replacing the file atomically so readers never see partial states"""
+
+    state_dir = Path(Settings.CATEGORY_STATE_DIR)
+    state_dir.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=state_dir, suffix='.tmp', delete=False) as f:
+        json.dump({'fingerprint': fingerprint, 'state': state.to_json()}, f)
+
+    os.replace(f.name, state_dir / f"{state.cat}.json")
+
+def score_category_captured(cat, result_list, ce_results):
+    """score a single category, collecting the printed output in the returned CategoryState instead of
+    printing it, see CategoryState.replay()"""
+
+    output = io.StringIO()
+
+    with redirect_stdout(output):
+        state = score_category(cat, result_list, ce_results)
+
+    state.output = output.getvalue()
+
+    return state
+
+@profiled("score_category")
+def score_category(cat, result_list, ce_results):
+    """score a single category, returning a CategoryState with everything compare_results needs from it
+
+    ce_results maps the category's disputed counterexample tuples to their CounterexampleResult. The output
+    is printed, use score_category_captured() to collect it in the returned state instead.
+    """
+
+    stats = ScoringStats()
+
+    print(f"\nCategory {cat}:")
+
+    # maps tool_name -> [score, num_verified, num_falsified, num_fastest, num_errors]
+    cat_score: Dict[str, List[int, int, int, int, int]] = {}
+    longtable_data: List[LongTableRow] = []
+    tool_times: Dict[str, List[float]] = defaultdict(list)
+
+    num_rows = 0
+
+    participating_tools = []
+
+    for tool_result in result_list:
+        cat_dict = tool_result.category_to_results
+
+        if not cat in cat_dict:
+            continue
+    
+        rows = cat_dict[cat]
+        assert num_rows == 0 or len(rows) == num_rows, f"tool {tool_result.tool_name}, cat {cat}, " + \
+            f"got {len(rows)} rows expected {num_rows}"
+
+        if num_rows == 0:
+            num_rows = len(rows)
+            print(f"Category {cat} has {num_rows} (from {tool_result.tool_name})")
+
+        participating_tools.append(tool_result)
+
+    # work with participating tools only
+    tool_names = [t.tool_name for t in participating_tools]
+    print(f"{len(participating_tools)} participating tools: {tool_names}")
+    table_rows = []
+    all_times = []
+    all_results = []
+
+    # score the whole category at once from instances x tools matrices
+    results = np.stack([t.category_to_results[cat].results for t in participating_tools], axis=1)
+    times = np.stack([t.category_to_results[cat].run_times for t in participating_tools], axis=1)
+
+    holds = results == ResultCode.HOLDS
+    violated = results == ResultCode.VIOLATED
+    disputed_rows = np.any(holds, axis=1) & np.any(violated, axis=1)
+
+    # maps tool_name -> CounterexampleResult for the violated results of each disputed instance
+    row_ce_results = [{} for _ in range(num_rows)]
+
+    for index in np.nonzero(disputed_rows)[0]:
+        for tool_index in np.nonzero(violated[index])[0]:
+            t = participating_tools[tool_index]
+            row_ce_results[index][t.tool_name] = ce_results[t.counterexample_tuple(cat, index)]
+
+    rand_gen_succeeded = np.zeros(num_rows, dtype=bool)
+
+    if "randgen" in tool_names:
+        rand_gen_succeeded = violated[:, tool_names.index("randgen")]
+
+    scores = get_scores(tool_names, results, times, rand_gen_succeeded, row_ce_results, stats)
+
+    for index in range(num_rows):
+        times_holds = []
+        tools_holds = []
+        times_violated = []
+        tools_violated = []
+        correct_violations = {}
+    
+        table_row = []
+        table_rows.append(table_row)
+        instance_str = participating_tools[0].result_instance_str(cat, index)
+        table_row.append(instance_str)
+
+        for t in participating_tools:
+            res, secs = t.single_result(cat, index)
+
+            if res == "unknown":
+                table_row.append("-")
+                continue
+
+            if not res in ["holds", "violated"]:
+                table_row.append(res)
+                continue
+
+            if res == "holds":
+                times_holds.append(secs)
+                tools_holds.append(t.tool_name)
+            else:
+                assert res == "violated"
+                times_violated.append(secs)
+                tools_violated.append(t.tool_name)
+
+            table_row.append(f"{round(secs, 1)} ({res[0]})")
+
+        print()
+
+        true_result = "-"
+
+        if times_holds and not times_violated:
+            true_result = 'unsat'
+        elif times_violated and not times_holds:
+            true_result = 'sat'
+        elif times_holds and times_violated:
+            print(f"WARNING: multiple results for index {index}. Violated: {len(times_violated)} " +
+                  f"({tools_violated}), Holds: {len(times_holds)} ({tools_holds})")
+            table_row.append('*multiple results*')
+
+            correct_violations = row_ce_results[index]
+
+            print(f"were violated counterexamples valid?: {correct_violations}")
+
+            if np.any([x == CounterexampleResult.CORRECT for x in correct_violations.values()]): ### HERE !!
+                true_result = 'sat'
+            else:
+                true_result = 'unsat'
+
+        print(f"Row: {table_row}")
+        print(f"True Result: {true_result}")
+
+        row_times = []
+        all_times.append(row_times)
+        all_results.append(None)
+        tool_times_scores: Dict[str, Tuple[Union[str, float], int]] = {}
+    
+        for tool_index, t in enumerate(participating_tools):
+            res, secs = t.single_result(cat, index)
+        
+            score, is_verified, is_falsified, is_fastest, is_error = \
+                [x[index, tool_index].item() for x in scores]
+            print(f"{index}: {t.tool_name} score: {score}, is_ver: {is_verified}, is_fals: {is_falsified}, " + \
+                  f"is_fastest: {is_fastest}")
+
+            if is_verified or is_falsified:
+                all_results[-1] = 'H' if is_verified else 'V'
+                row_times.append(secs)
+            
+                tool_times_scores[t.tool_name] = (secs, score)
+            else:
+                row_times.append(None)
+
+                if is_error:
+                    tool_times_scores[t.tool_name] = (secs, score)
+
+            if t.tool_name in cat_score:
+                tool_score_tup = cat_score[t.tool_name]
+            else:
+                tool_score_tup = [0, 0, 0, 0, 0]
+                cat_score[t.tool_name] = tool_score_tup
+
+            # [score, num_verified, num_falsified, num_fastest]
+            tool_score_tup[0] += score
+            tool_score_tup[1] += 1 if is_verified else 0
+            tool_score_tup[2] += 1 if is_falsified else 0
+            tool_score_tup[3] += 1 if is_fastest else 0
+            tool_score_tup[4] += 1 if is_error else 0
+            tool_score_tup = None
+
+        # accumulate long table data
+        longtable_data.append(LongTableRow(cat, index, true_result, tool_times_scores))
+
+    print("--------------------")
+    num_holds = 0
+    num_violated = 0
+    num_unknown = 0
+
+    for i, (row_times, result) in enumerate(zip(all_times, all_results)):
+        assert len(row_times) == len(tool_names)
+
+        if result is None:
+            num_unknown += 1
+        else:                
+            for t, tool in zip(row_times, tool_names):
+                if t is not None:
+                    #assert t > 0, "time was zero?"
+                    tool_times[tool].append(t)
+        
+            if result == 'V':
+                num_violated += 1
+            elif result == 'H':
+                num_holds += 1
+
+    print(f"Total Violated: {num_violated}")
+    print(f"Total Holds: {num_holds}")
+    print(f"Total Unknown: {num_unknown}")
+
+    print("--------------------")
+    print(", ".join(tool_names))
+
+    for table_row in table_rows:
+        print(", ".join(table_row))
+
+    print(f"---------\nCategory {cat}:")
+
+    return CategoryState(cat, cat_score, tool_times, longtable_data, stats)
+
+def get_disputed_counterexamples(result_list, cat):
+    """get the counterexample tuples that need to be checked in a category, which are the
+    violated results on instances where some other tool reported holds
+
+    the counterexample files of all violated results must exist, this is checked here before any are read"""
+
+    rv = []
+    participating_tools = [t for t in result_list if cat in t.category_to_results]
+
+    if not participating_tools:
+        return rv
+
+    num_rows = len(participating_tools[0].category_to_results[cat])
+
+    for index in range(num_rows):
+        some_holds = False
+        violated_tups = []
+
+        for t in participating_tools:
+            res, _ = t.single_result(cat, index)
+
+            if res == "holds":
+                some_holds = True
+            elif res == "violated":
+                tup = t.counterexample_tuple(cat, index)
+                assert Path(tup[0]).is_file(), f"CE path not found: {tup[0]}"
+                violated_tups.append(tup)
+
+        if some_holds:
+            rv += violated_tups
+
+    return rv
+
 def round_time(t):
     """round time in table"""
 
@@ -655,9 +1123,9 @@ def print_longtable_footer(f):
 \end{center}\n\n''')
 
 
-def get_score(tool_name, res, secs, rand_gen_succeded, times_holds, times_violated, ce_results):
-    """Get the score for the given result
-    Actually returns a 4-tuple: score, is_verified, is_falsified, is_fastest
+def get_score(tool_name, res, secs, rand_gen_succeded, times_holds, times_violated, ce_results, stats):
+    """Get the score for the given result, updating the ScoringStats stats
+    Actually returns a 5-tuple: score, is_verified, is_falsified, is_fastest, is_error
 
     Correct hold: 10 points
     Correct violated (where random tests did not succeed): 10 points
@@ -697,44 +1165,44 @@ def get_score(tool_name, res, secs, rand_gen_succeded, times_holds, times_violat
         assert res == "violated"
         score = 1
 
-        ToolResult.num_verified[tool_name] += 1
-        ToolResult.num_violated[tool_name] += 1
+        stats.num_verified[tool_name] += 1
+        stats.num_violated[tool_name] += 1
 
         is_falsified = True
     elif penalize_no_ce and num_holds > 0 and res == "violated" and not ce_results[tool_name]:
         # Rule: If a witness is not provided, for the purposes of scoring if there are
         # mismatches between tools we will count the tool without the witness as incorrect.
         score = -100
-        ToolResult.incorrect_results[tool_name] += 1
+        stats.incorrect_results[tool_name] += 1
         print(f"tool {tool_name} did not produce a valid counterexample and there are mismatching results")
 
-        ToolResult.toolerror_counts[f'{tool_name}_no-ce-but-required'] += 1
+        stats.toolerror_counts[f'{tool_name}_no-ce-but-required'] += 1
         is_error = True
     elif res == "violated" and num_holds > 0 and not valid_ce:
         score = -100
-        ToolResult.incorrect_results[tool_name] += 1
+        stats.incorrect_results[tool_name] += 1
         is_error = True
 
-        ToolResult.toolerror_counts[f'{tool_name}_{ce_results[tool_name]}'] += 1
+        stats.toolerror_counts[f'{tool_name}_{ce_results[tool_name]}'] += 1
     elif res == "holds" and valid_ce:
         score = -100
-        ToolResult.incorrect_results[tool_name] += 1
+        stats.incorrect_results[tool_name] += 1
         is_error = True
 
-        ToolResult.toolerror_counts[f'{tool_name}_incorrect_unsat'] += 1
+        stats.toolerror_counts[f'{tool_name}_incorrect_unsat'] += 1
     else:
         # correct result!
 
-        ToolResult.num_verified[tool_name] += 1
+        stats.num_verified[tool_name] += 1
 
         if res == "holds":
             is_verified = True
             times = times_holds.copy()
-            ToolResult.num_holds[tool_name] += 1
+            stats.num_holds[tool_name] += 1
         else:
             assert res == "violated"
             times = times_violated.copy()
-            ToolResult.num_violated[tool_name] += 1
+            stats.num_violated[tool_name] += 1
 
             is_falsified = True
             
@@ -757,8 +1225,79 @@ def get_score(tool_name, res, secs, rand_gen_succeded, times_holds, times_violat
 
     return score, is_verified, is_falsified, is_fastest, is_error
 
-def print_stats(result_list):
-    """print stats about measurements"""
+def get_scores(tool_names, results, times, rand_gen_succeeded, ce_results, stats):
+    """Get the scores for all instances of a category at once, see get_score() for the rules
+
+    results is a num_instances x num_tools array of ResultCode values and times has the matching run times.
+    rand_gen_succeeded is a bool per instance, and ce_results is a list with a dict per instance mapping
+    tool_name -> CounterexampleResult for the violated results of disputed instances (empty otherwise).
+
+    Returns arrays score, is_verified, is_falsified, is_fastest, is_error, each shaped like results, and
+    updates the ScoringStats stats exactly like calling get_score() on each cell in row-major order would.
+    """
+
+    assert not np.any(rand_gen_succeeded), "VNNCOMP 2022 didn't use randgen"
+
+    holds = results == ResultCode.HOLDS
+    violated = results == ResultCode.VIOLATED
+
+    valid_ce = np.array([any(x == CounterexampleResult.CORRECT for x in d.values()) for d in ce_results],
+                        dtype=bool).reshape(-1, 1)
+
+    incorrect_violated = violated & np.any(holds, axis=1, keepdims=True) & ~valid_ce
+    incorrect_holds = holds & valid_ce
+    is_error = incorrect_violated | incorrect_holds
+
+    correct = (holds | violated) & ~is_error
+    is_verified = correct & holds
+    is_falsified = correct & violated
+
+    # time bonus, comparing against the other tools with the same result
+    clamped_times = np.maximum(times, Settings.SCORING_MIN_TIME)
+    is_fastest = np.zeros(results.shape, dtype=bool)
+    is_second = np.zeros(results.shape, dtype=bool)
+
+    for same_result in [holds, violated]:
+        sorted_times = np.sort(np.where(same_result, clamped_times, np.inf), axis=1)
+        min_time = sorted_times[:, :1]
+        second_time = sorted_times[:, 1:2] if results.shape[1] > 1 else np.full_like(min_time, np.inf)
+
+        fastest = correct & same_result & (clamped_times < min_time + 0.2)
+        is_fastest |= fastest
+        is_second |= correct & same_result & ~fastest & (clamped_times < second_time + 0.2)
+
+    score = np.where(is_error, -100, np.where(correct, 10 + 2 * is_fastest + is_second, 0))
+
+    for counts, mask in [(stats.num_verified, correct), (stats.num_violated, is_falsified),
+                         (stats.num_holds, is_verified), (stats.incorrect_results, is_error)]:
+        add_tool_counts(counts, tool_names, mask)
+
+    for index, tool_index in np.argwhere(is_error):
+        tool_name = tool_names[tool_index]
+
+        if violated[index, tool_index]:
+            stats.toolerror_counts[f'{tool_name}_{ce_results[index][tool_name]}'] += 1
+        else:
+            stats.toolerror_counts[f'{tool_name}_incorrect_unsat'] += 1
+
+    return score, is_verified, is_falsified, is_fastest, is_error
+
+def add_tool_counts(counts, tool_names, mask):
+    """add the number of True entries in each column of mask to the counts dict of each tool
+
+    tools are added in the order of their first True entry in row-major order, so the dict order matches
+    what incrementing cell by cell would produce"""
+
+    num_rows = mask.shape[0]
+    first_rows = np.where(np.any(mask, axis=0), np.argmax(mask, axis=0), num_rows)
+
+    for tool_index in sorted(range(len(tool_names)), key=lambda i: (first_rows[i], i)):
+        if first_rows[tool_index] < num_rows:
+            counts[tool_names[tool_index]] += int(np.sum(mask[:, tool_index]))
+
+@profiled("print_stats")
+def print_stats(result_list, stats):
+    """print stats about measurements, using the ScoringStats from the scored categories"""
 
     with open(Settings.STATS_LATEX, 'w', encoding='utf-8') as f:
         tee(f, '\n%%%%%%%%%% Stats %%%%%%%%%%%')
@@ -780,11 +1319,11 @@ def print_stats(result_list):
 
         print_table_footer(f)
 
-        items = [("Num Benchmarks Participated", ToolResult.num_categories),
-                 ("Num Instances Verified", ToolResult.num_verified),
-                 ("Num SAT", ToolResult.num_violated),
-                 ("Num UNSAT", ToolResult.num_holds),
-                 ("Incorrect Results (or Missing CE)", ToolResult.incorrect_results),
+        items = [("Num Benchmarks Participated", stats.num_categories),
+                 ("Num Instances Verified", stats.num_verified),
+                 ("Num SAT", stats.num_violated),
+                 ("Num UNSAT", stats.num_holds),
+                 ("Incorrect Results (or Missing CE)", stats.incorrect_results),
                  ]
 
         for index, (label, d) in enumerate(items):
@@ -805,7 +1344,7 @@ def print_stats(result_list):
 
             print_table_footer(f)
 
-    print(ToolResult.toolerror_counts)
+    print(stats.toolerror_counts)
 
 def latex_cat_name(cat):
     """get latex version of category name"""
@@ -879,6 +1418,7 @@ def gnuplot_tool_name(tool):
 
     return tool
 
+@profiled("write_gnuplot_files")
 def write_gnuplot_files(gnuplot_tool_cat_times, sorted_tools):
     """write files with data for gnuplot cactus plots"""
 
@@ -1150,9 +1690,70 @@ def write_gnuplot_files(gnuplot_tool_cat_times, sorted_tools):
 
         f.write("\"\n\n")
 
+def parse_args():
+    """parse command-line arguments"""
+
+    parser = argparse.ArgumentParser(description="Process vnncomp results")
+    parser.add_argument("--reverify", action="store_true",
+                        help="recheck all counterexamples instead of reusing verdicts from Settings.VERDICT_DB")
+    parser.add_argument("--output", metavar="FILE",
+                        help="also write all printed output to FILE (run.sh uses results.txt)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only rescore categories whose results or counterexamples changed since the last run")
+    parser.add_argument("--profile", action="store_true",
+                        help="time the stages of the run, print a summary at the end and save it to " + \
+                        "Settings.PROFILE_REPORT")
+
+    return parser.parse_args()
+
+class TeeOutput:
+    """file-like object that writes to several streams, used to print and save the output at the same time"""
+
+    def __init__(self, *streams):
+        self.streams = streams
+
+    def write(self, text):
+        """write to all streams"""
+
+        for stream in self.streams:
+            stream.write(text)
+
+    def flush(self):
+        """flush all streams"""
+
+        for stream in self.streams:
+            stream.flush()
+
 def main():
     """main entry point"""
 
+    args = parse_args()
+    Settings.CE_REVERIFY = args.reverify
+    Settings.INCREMENTAL = args.incremental
+
+    profiling.enable(args.profile)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            with redirect_stdout(TeeOutput(sys.stdout, f)):
+                process_all_profiled()
+    else:
+        process_all_profiled()
+
+def process_all_profiled():
+    """run process_all(), then print and save the timing report if profiling is enabled"""
+
+    with profiling.span("total"):
+        process_all()
+
+    if profiling.is_enabled():
+        profiling.write_report(Settings.PROFILE_REPORT)
+        profiling.get_profiler().print_summary()
+        print(f"saved profile to {Settings.PROFILE_REPORT}")
+
+def process_all():
+    """load all results, then score the unscored and scored categories"""
+
     # use single overhead for all tools. False will have two different overheads for some tools depending
     # on if GPU needed to be initialized (manually entered)
     single_overhead = True
@@ -1160,8 +1761,7 @@ def main():
 
     #####################################3
     #csv_list = glob.glob("results_csv/*.csv")
-    csv_list = glob.glob(Settings.CSV_GLOB)
-    csv_list.sort()
+    csv_list = get_csv_list()
 
     # clear files so we can append to them
     with open(Settings.SCORED_LATEX, 'w', encoding='utf-8') as f:
@@ -1204,26 +1804,28 @@ def main():
 
     for tool in tool_list:
         gnuplot_tool_cat_times[tool] = defaultdict(list)
+
+    # read each csv once, both passes use the same tables and only differ in which categories they keep
+    tool_csv_tables = {tool_name: ToolResult.load_csv(csv_path) for csv_path, tool_name in zip(csv_list, tool_list)}
         
     for scored in [False, True]:
         result_list = []
-        ToolResult.reset()
+        stats = ScoringStats()
 
         for csv_path, tool_name in zip(csv_list, tool_list):
-            tr = ToolResult(scored, tool_name, csv_path, cpu_benchmarks[tool_name], skip_benchmarks[tool_name])
+            tr = ToolResult(scored, tool_name, csv_path, cpu_benchmarks[tool_name], skip_benchmarks[tool_name],
+                            tool_csv_tables[tool_name])
             result_list.append(tr)
+            stats.num_categories[tool_name] = len(tr.category_to_results)
 
         # compare results across tools
-        compare_results(tool_list, gnuplot_tool_cat_times, result_list, single_overhead, scored)
+        compare_results(tool_list, gnuplot_tool_cat_times, result_list, single_overhead, scored, stats)
 
         if scored:
-            print_stats(result_list)
+            print_stats(result_list, stats)
 
     if Settings.SKIP_TOOLS:
         print(f"Note: tools were skipped: {Settings.SKIP_TOOLS}")
 
 if __name__ == "__main__":
-    #from counterexamples import get_ce_diff
-    #get_ce_diff.clear_cache()
-
     main()
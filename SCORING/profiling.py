@@ -0,0 +1,174 @@
+'''
+opt-in profiling for the scoring scripts
+
+Code is instrumented with named spans (wall and cpu time plus call count) and counters (cache hits and misses and
+similar). Nothing is recorded unless enable() was called, which process_results.py does for --profile. Worker
+processes start from a reset profiler and send a snapshot back to the parent, which merges it, so the report
+covers all processes.
+'''
+
+import sys
+import time
+import json
+import functools
+import resource
+from pathlib import Path
+from contextlib import contextmanager, nullcontext
+from collections import defaultdict
+
+class Profiler:
+    '''accumulated span timings and counters'''
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = defaultdict(lambda: [0, 0.0, 0.0]) # maps name -> [calls, wall secs, cpu secs]
+        self.counters = defaultdict(int)
+        self.worker_peak_rss_mb = 0.0
+
+    def reset(self):
+        'clear all recorded data, keeping enabled unchanged'
+
+        self.spans.clear()
+        self.counters.clear()
+        self.worker_peak_rss_mb = 0.0
+
+    @contextmanager
+    def _span(self, name):
+        'record a single span, see span()'
+
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+
+        try:
+            yield
+        finally:
+            entry = self.spans[name]
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start_wall
+            entry[2] += time.process_time() - start_cpu
+
+    def snapshot(self):
+        'get the recorded data as a picklable dict, see merge()'
+
+        return {'spans': {name: list(entry) for name, entry in self.spans.items()},
+                'counters': dict(self.counters),
+                'peak_rss_mb': max(get_peak_rss_mb(), self.worker_peak_rss_mb)}
+
+    def merge(self, snapshot):
+        'add the data from a snapshot of another process'
+
+        for name, (calls, wall, cpu) in snapshot['spans'].items():
+            entry = self.spans[name]
+            entry[0] += calls
+            entry[1] += wall
+            entry[2] += cpu
+
+        for name, count in snapshot['counters'].items():
+            self.counters[name] += count
+
+        self.worker_peak_rss_mb = max(self.worker_peak_rss_mb, snapshot['peak_rss_mb'])
+
+    def report(self):
+        'get a json-compatible report'
+
+        spans = {name: {'calls': calls, 'wall_secs': wall, 'cpu_secs': cpu}
+                 for name, (calls, wall, cpu) in sorted(self.spans.items(), key=lambda item: -item[1][1])}
+
+        return {'spans': spans,
+                'counters': dict(sorted(self.counters.items())),
+                'peak_rss_mb': get_peak_rss_mb(),
+                'worker_peak_rss_mb': self.worker_peak_rss_mb}
+
+    def print_summary(self, file=None):
+        'print a human-readable summary of report(), to sys.stdout at the time of the call if file is None'
+
+        file = sys.stdout if file is None else file
+        report = self.report()
+
+        print("\n###############", file=file)
+        print("### Profile ###", file=file)
+        print("###############", file=file)
+
+        print(f"{'span':<40} {'calls':>8} {'wall s':>10} {'cpu s':>10}", file=file)
+
+        for name, entry in report['spans'].items():
+            print(f"{name:<40} {entry['calls']:>8} {entry['wall_secs']:>10.3f} {entry['cpu_secs']:>10.3f}",
+                  file=file)
+
+        if report['counters']:
+            print(file=file)
+
+            for name, count in report['counters'].items():
+                print(f"{name:<40} {count:>8}", file=file)
+
+        print(f"\npeak rss: {report['peak_rss_mb']:.1f} MB (workers: {report['worker_peak_rss_mb']:.1f} MB)",
+              file=file)
+
+def get_peak_rss_mb():
+    'get the peak resident set size of this process in MB'
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes on linux, bytes on macos
+    return maxrss / (1024**2 if sys.platform == 'darwin' else 1024)
+
+_profiler = Profiler()
+
+def get_profiler():
+    'get the profiler of this process'
+
+    return _profiler
+
+def enable(enabled=True):
+    'start (or stop) recording'
+
+    _profiler.enabled = enabled
+
+def is_enabled():
+    'is the profiler recording?'
+
+    return _profiler.enabled
+
+def span(name):
+    'context manager that records the time spent in the block under name, if profiling is enabled'
+
+    if not _profiler.enabled:
+        return nullcontext()
+
+    return _profiler._span(name) # pylint: disable=protected-access
+
+def profiled(name):
+    'decorator that records each call of a function as a span, see span()'
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _profiler.enabled:
+                return func(*args, **kwargs)
+
+            with _profiler._span(name): # pylint: disable=protected-access
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+def count(name, amount=1):
+    'increment a counter, if profiling is enabled'
+
+    if _profiler.enabled:
+        _profiler.counters[name] += amount
+
+def start_worker(enabled):
+    'called at the start of a task in a worker process, which may have inherited data from its parent'
+
+    _profiler.enabled = enabled
+    _profiler.reset()
+
+def write_report(filename):
+    'save report() as json'
+
+    Path(filename).parent.mkdir(parents=True, exist_ok=True)
+
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(_profiler.report(), f, indent=2)
@@ -1,8 +1,4 @@
 #!/bin/bash -e
 
-python3 process_results.py
-
-# run again, capturing output to file
-python3 process_results.py > results.txt && pushd plots && gnuplot make_plots.gnuplot && cp *.pdf ../latex/cactus && popd && pushd latex && make ; popd
-
-
+# print the output and save it to results.txt in a single run
+python3 process_results.py --output results.txt && pushd plots && gnuplot make_plots.gnuplot && cp *.pdf ../latex/cactus && popd && pushd latex && make ; popd
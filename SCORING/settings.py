@@ -14,7 +14,8 @@ class GnuplotSettings:
 class Settings:
     '''static container for settings'''
 
-    CSV_GLOB = "../*/results.csv"
+    CSV_GLOB = "../*/results.csv" # results.csv.gz files are also used
+    CSV_CHUNK_ROWS = 65536 # rows converted to numpy columns at a time when reading results csv files
     TOOL_LIST_GLOB_INDEX = 1
 
     SCORING_MIN_TIME = 1.0
@@ -25,6 +26,38 @@ class Settings:
     BENCHMARK_REPO = "/home/stan/repositories/vnncomp2022_benchmarks"
     COUNTEREXAMPLE_TOL = 1e-4
 
+    # .gz benchmark files are extracted here, instead of next to the original in BENCHMARK_REPO
+    BENCHMARK_CACHE_DIR = "cache/benchmarks"
+
+    # onnx models / sessions kept in memory per process, by total size of the onnx files
+    ONNX_CACHE_MAX_BYTES = 4 * 1024**3
+
+    # max number of counterexamples for the same network executed in one onnxruntime call
+    CE_BATCH_SIZE = 256
+
+    # worker processes used to check counterexamples, None uses all cpus
+    CE_NUM_WORKERS = None
+
+    # worker processes used to score categories, None uses all cpus
+    SCORING_NUM_WORKERS = None
+
+    # parsed vnnlib specs, keyed by file contents (see vnnlib.read_vnnlib_arrays_cached)
+    VNNLIB_CACHE_DIR = "cache/vnnlib"
+
+    # sqlite database of counterexample verdicts, keyed by file contents
+    VERDICT_DB = "cache/verdicts.sqlite"
+
+    # ignore stored verdicts and recheck every counterexample (set by process_results.py --reverify)
+    CE_REVERIFY = False
+
+    # reuse the saved scoring state of categories whose results and counterexamples didn't change since the
+    # last run (set by process_results.py --incremental)
+    INCREMENTAL = False
+    CATEGORY_STATE_DIR = "cache/category_state"
+
+    # where the timing report is saved (when process_results.py --profile is used)
+    PROFILE_REPORT = "cache/profile.json"
+
     TOOL_NAME_SUBS_LATEX = [
             ('alpha_beta_crown', '$\\alpha$,$\\beta$ Crown'),
             ('mn_bab', 'MN BaB')
@@ -0,0 +1,148 @@
+'''
+persistent store of counterexample verdicts and network outputs
+
+Verdicts are kept in a SQLite database keyed by the hashes of the onnx file, the vnnlib file and the
+counterexample contents, plus the tolerance, so they stay valid across runs until one of the inputs or
+VERDICT_VERSION changes. Each verdict is saved with the validation stage at which checking stopped (see
+ValidationStage in counterexamples.py).
+The same database holds the outputs of networks on counterexample inputs, keyed by the hashes of the onnx file
+and the input values, so each distinct input is executed once even if several tools submit it (see
+check_ce_batch in counterexamples.py), and the sha256 of files by path, size and modification time, so large
+onnx files are not hashed again in every run (see file_sha256 in vnnlib.py).
+The database uses write-ahead logging and a busy timeout, so several processes can read and write at once.
+'''
+
+import os
+import time
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+from settings import Settings
+
+# version of how verdicts are computed, stored in the database. Verdicts of a different version are discarded when
+# the store is opened. Bump it if a change to the checks can change a stored result or message.
+VERDICT_VERSION = 1
+
+class VerdictStore:
+    '''counterexample verdicts in a SQLite database'''
+
+    def __init__(self, db_path):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.db_path = db_path
+        self.con = sqlite3.connect(db_path, timeout=60)
+        self.con.execute("PRAGMA journal_mode=WAL")
+
+        with self.con:
+            self.con.execute("""CREATE TABLE IF NOT EXISTS verdicts (
+                onnx_hash TEXT NOT NULL,
+                vnnlib_hash TEXT NOT NULL,
+                ce_hash TEXT NOT NULL,
+                tol REAL NOT NULL,
+                result TEXT NOT NULL,
+                msg TEXT NOT NULL,
+                ce_path TEXT,
+                created REAL,
+                stage TEXT,
+                PRIMARY KEY (onnx_hash, vnnlib_hash, ce_hash, tol))""")
+
+            # databases created before the stage column was added
+            columns = [row[1] for row in self.con.execute("PRAGMA table_info(verdicts)")]
+
+            if "stage" not in columns:
+                self.con.execute("ALTER TABLE verdicts ADD COLUMN stage TEXT")
+
+            self.con.execute("""CREATE TABLE IF NOT EXISTS outputs (
+                onnx_hash TEXT NOT NULL,
+                input_hash TEXT NOT NULL,
+                output BLOB NOT NULL,
+                created REAL,
+                PRIMARY KEY (onnx_hash, input_hash))""")
+
+            self.con.execute("""CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                PRIMARY KEY (path, size, mtime_ns))""")
+
+            # stored network outputs don't depend on how the checks work, so only the verdicts are discarded
+            if self.con.execute("PRAGMA user_version").fetchone()[0] != VERDICT_VERSION:
+                self.con.execute("DELETE FROM verdicts")
+                self.con.execute(f"PRAGMA user_version = {VERDICT_VERSION}")
+
+    def get(self, key):
+        '''get the stored (result, msg) for a key (onnx_hash, vnnlib_hash, ce_hash, tol), or None'''
+
+        cur = self.con.execute("SELECT result, msg FROM verdicts WHERE onnx_hash=? AND vnnlib_hash=? " + \
+                               "AND ce_hash=? AND tol=?", key)
+
+        return cur.fetchone()
+
+    def put(self, key, result, msg, ce_path=None, stage=None):
+        '''store the verdict for a key, replacing any previous one'''
+
+        with self.con:
+            self.con.execute("INSERT OR REPLACE INTO verdicts (onnx_hash, vnnlib_hash, ce_hash, tol, result, msg, " + \
+                             "ce_path, created, stage) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             tuple(key) + (result, msg, ce_path, time.time(), stage))
+
+    def get_output(self, key):
+        '''get the stored flattened network output (float64 array) for a key (onnx_hash, input_hash), or None'''
+
+        cur = self.con.execute("SELECT output FROM outputs WHERE onnx_hash=? AND input_hash=?", key)
+        row = cur.fetchone()
+
+        return None if row is None else np.frombuffer(row[0], dtype=np.float64)
+
+    def put_outputs(self, items):
+        '''store several network outputs at once, items is a list of (key, flattened output)'''
+
+        now = time.time()
+
+        with self.con:
+            self.con.executemany("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?)",
+                                 [tuple(key) + (np.asarray(output, dtype=np.float64).tobytes(), now)
+                                  for key, output in items])
+
+    def get_file_hash(self, key):
+        '''get the stored sha256 of a file for a key (absolute path, size, mtime in ns), or None'''
+
+        row = self.con.execute("SELECT sha256 FROM file_hashes WHERE path=? AND size=? AND mtime_ns=?", key).fetchone()
+
+        return None if row is None else row[0]
+
+    def put_file_hash(self, key, sha256):
+        '''store the sha256 of a file, see get_file_hash()'''
+
+        with self.con:
+            self.con.execute("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)", tuple(key) + (sha256,))
+
+    def clear_verdicts(self):
+        '''remove all stored verdicts'''
+
+        with self.con:
+            self.con.execute("DELETE FROM verdicts")
+
+    def clear_outputs(self):
+        '''remove all stored network outputs'''
+
+        with self.con:
+            self.con.execute("DELETE FROM outputs")
+
+_store = None
+_store_pid = None
+
+def get_verdict_store():
+    '''get this process's connection to the verdict store at Settings.VERDICT_DB'''
+
+    global _store, _store_pid
+
+    # sqlite connections must not be shared with forked worker processes
+    if _store is None or _store_pid != os.getpid():
+        _store = VerdictStore(Settings.VERDICT_DB)
+        _store_pid = os.getpid()
+
+    return _store
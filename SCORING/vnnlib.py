@@ -5,16 +5,48 @@ Stanley Bak
 June 2021
 '''
 
-from copy import deepcopy
 import re
+import os
+import shutil
+import hashlib
+import tempfile
+import functools
+import itertools
+from pathlib import Path
 
 import numpy as np
 
 import onnxruntime as ort
 import onnx
 
-from cachier import cachier
-import datetime
+import profiling
+from profiling import profiled
+from settings import Settings
+from verdict_store import get_verdict_store
+
+# used to remove the space after '(' or ')' in a statement
+REGEX_SPACE_AFTER_PAREN = re.compile(r"([()]) ")
+
+# used by the fast path in read_box_constraints_fast()
+REGEX_COMMENT = re.compile(r";[^\n]*")
+REGEX_DECLARE_ANY = re.compile(r"\(\s*declare-const\s+[XY]_\d+\s+Real\s*\)")
+REGEX_BOX_ASSERT = re.compile(r"\(\s*assert\s*\(\s*(<=|>=)\s+X_(\d+)\s+([^\s()]+)\s*\)\s*\)")
+
+# larger files are parsed in a streaming way, without the fast path
+VNNLIB_FAST_PATH_MAX_BYTES = 64 * 1024**2
+
+# on-disk cache of parsed specs in Settings.VNNLIB_CACHE_DIR, used by read_vnnlib_spec_cached(). Bump the version
+# if the stored arrays change.
+VNNLIB_CACHE_VERSION = 3
+VNNLIB_CACHE_ARRAYS = ('lb', 'ub', 'mat_indptr', 'mat_indices', 'mat_data', 'mat_shape', 'rhs', 'term_box',
+                       'term_rows', 'factor_boxes', 'factor_terms', 'factor_base_rows')
+
+# files at least this large have their sha256 saved across runs by file_sha256(), smaller ones are cheaper to hash
+# again than to look up
+FILE_SHA256_STORE_MIN_BYTES = 1024**2
+
+# number of SpecEvaluator objects kept in memory per process by get_spec_evaluator()
+SPEC_EVALUATOR_CACHE_SIZE = 256
 
 def read_statements(vnnlib_filename):
     '''process vnnlib and return a list of strings (statements)
@@ -22,116 +54,490 @@ def read_statements(vnnlib_filename):
     useful to get rid of comments and blank lines and combine multi-line statements
     '''
 
+    return list(iter_statements(vnnlib_filename))
+
+def iter_statements(vnnlib_filename):
+    '''generator version of read_statements, yielding one normalized statement at a time
+
+    the file is read through a buffered line iterator in a single pass, so memory use is proportional to the
+    longest statement rather than the whole file
+    '''
+
     with open(vnnlib_filename, 'r') as f:
-        lines = f.readlines()
+        yield from iter_statements_from_lines(f)
 
-    lines = [line.strip() for line in lines]
-    assert len(lines) > 0
+def iter_statements_from_lines(lines):
+    '''yield normalized statements from an iterable of vnnlib lines'''
 
     # combine lines if case a single command spans multiple lines
     open_parentheses = 0
-    statements = []
-    current_statement = ''
-    
+    current_parts = []
+    read_any_line = False
+
     for line in lines:
+        read_any_line = True
         comment_index = line.find(';')
 
         if comment_index != -1:
-            line = line[:comment_index].rstrip()
-        
+            line = line[:comment_index]
+
+        line = line.strip()
+
         if not line:
             continue
 
-        new_open = line.count('(')
-        new_close = line.count(')')
-
-        open_parentheses += new_open - new_close
+        open_parentheses += line.count('(') - line.count(')')
 
         assert open_parentheses >= 0, "mismatched parenthesis in vnnlib file"
 
-        # add space
-        current_statement += ' ' if current_statement else ''
-        current_statement += line
+        current_parts.append(line)
 
         if open_parentheses == 0:
-            statements.append(current_statement)
-            current_statement = ''
+            yield normalize_statement(current_parts)
+            current_parts = []
 
-    if current_statement:
-        statements.append(current_statement)
+    assert read_any_line
 
-    # remove repeated whitespace characters
-    statements = [" ".join(s.split()) for s in statements]
+    if current_parts:
+        yield normalize_statement(current_parts)
 
-    # remove space after '('
-    statements = [s.replace('( ', '(') for s in statements]
+def normalize_statement(parts):
+    '''join the lines of a statement, removing repeated whitespace and any space after a parenthesis'''
 
-    # remove space after ')'
-    statements = [s.replace(') ', ')') for s in statements]
+    statement = " ".join(" ".join(parts).split())
 
-    return statements
+    return REGEX_SPACE_AFTER_PAREN.sub(r"\1", statement)
+
+class VnnlibTerm:
+    '''a conjunction of constraints while parsing a vnnlib file
+
+    lb and ub are the input box. They are shared between terms that only differ in their output constraints,
+    and are copied the first time a term adds its own input constraint.
+    '''
+
+    def __init__(self, lb, ub, rows, rhs, owns_box):
+        self.lb = lb
+        self.ub = ub
+        self.rows = rows # list of (columns, values), the nonzeros of each row of the output constraint matrix
+        self.rhs = rhs
+        self.owns_box = owns_box
+
+    def split(self):
+        '''get a new term with the same constraints, sharing the input box'''
+
+        return VnnlibTerm(self.lb, self.ub, list(self.rows), list(self.rhs), False)
+
+    def add_constraint(self, op, first, second, num_inputs, num_outputs, copy_box=True):
+        '''add the constraint "(op first second)". If copy_box is False, a shared input box is updated in place'''
+
+        if first.startswith("X_"):
+            # Input constraints
+            index = int(first[2:])
+
+            assert not second.startswith("X") and not second.startswith("Y"), \
+                                         f"input constraints must be box ({op} {first} {second})"
+            assert 0 <= index < num_inputs
+
+            if copy_box and not self.owns_box:
+                self.lb = self.lb.copy()
+                self.ub = self.ub.copy()
+                self.owns_box = True
+
+            if op == "<=":
+                self.ub[index] = min(float(second), self.ub[index])
+            else:
+                self.lb[index] = max(float(second), self.lb[index])
 
-def update_rv_tuple(rv_tuple, op, first, second, num_inputs, num_outputs):
-    'update tuple from rv in read_vnnlib_simple, with the passed in constraint "(op first second)"'
-    
-    if first.startswith("X_"):
-        # Input constraints
-        index = int(first[2:])
-
-        assert not second.startswith("X") and not second.startswith("Y"), \
-                                     f"input constraints must be box ({op} {first} {second})"
-        assert 0 <= index < num_inputs
-
-        limits = rv_tuple[0][index]
-        
-        if op == "<=":
-            limits[1] = min(float(second), limits[1])
-        else:
-            limits[0] = max(float(second), limits[0])
-
-        assert limits[0] <= limits[1], f"{first} range is empty: {limits}"
-
-    else:
-        # output constraint
-        if op == ">=":
-            # swap order if op is >=
-            first, second = second, first
-
-        row = [0.0] * num_outputs
-        rhs = 0.0
-
-        # assume op is <=
-        if first.startswith("Y_") and second.startswith("Y_"):
-            index1 = int(first[2:])
-            index2 = int(second[2:])
-
-            row[index1] = 1
-            row[index2] = -1
-        elif first.startswith("Y_"):
-            index1 = int(first[2:])
-            row[index1] = 1
-            rhs = float(second)
         else:
-            assert second.startswith("Y_")
-            index2 = int(second[2:])
-            row[index2] = -1
-            rhs = -1 * float(first)
+            # output constraint, only the nonzeros of the row are stored
+            if op == ">=":
+                # swap order if op is >=
+                first, second = second, first
+
+            rhs = 0.0
+
+            # assume op is <=
+            if first.startswith("Y_") and second.startswith("Y_"):
+                index1 = int(first[2:])
+                index2 = int(second[2:])
+                assert 0 <= index1 < num_outputs and 0 <= index2 < num_outputs
+
+                if index1 == index2:
+                    # -1 overwrites 1 in a dense row
+                    row = ((index2,), (-1.0,))
+                else:
+                    row = ((index1, index2), (1.0, -1.0))
+            elif first.startswith("Y_"):
+                index1 = int(first[2:])
+                assert 0 <= index1 < num_outputs
+                row = ((index1,), (1.0,))
+                rhs = float(second)
+            else:
+                assert second.startswith("Y_")
+                index2 = int(second[2:])
+                assert 0 <= index2 < num_outputs
+                row = ((index2,), (-1.0,))
+                rhs = -1 * float(first)
+
+            self.rows.append(row)
+            self.rhs.append(rhs)
+
+class SparseConstraints:
+    '''the output constraints mat * y <= rhs of one term, with mat stored in CSR form
+
+    row i has the values data[indptr[i]:indptr[i+1]] in the columns indices[indptr[i]:indptr[i+1]], every row
+    has at least one. Rows from the parser have one or two nonzeros, so memory doesn't depend on num_outputs.
+    '''
 
-        mat, rhs_list = rv_tuple[1], rv_tuple[2]
-        mat.append(row)
-        rhs_list.append(rhs)
+    def __init__(self, indptr, indices, data, rhs, num_outputs):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.rhs = rhs
+        self.num_outputs = num_outputs
 
-def make_input_box_dict(num_inputs):
-    'make a dict for the input box'
+    @staticmethod
+    def from_rows(rows, rhs, num_outputs):
+        '''create from a list of (columns, values) rows, see VnnlibTerm'''
 
-    rv = {i: [-np.inf, np.inf] for i in range(num_inputs)}
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(columns) for columns, _ in rows])
 
-    return rv
+        indices = np.array([c for columns, _ in rows for c in columns], dtype=np.int64)
+        data = np.array([v for _, values in rows for v in values], dtype=float)
+
+        return SparseConstraints(indptr, indices, data, np.array(rhs, dtype=float), num_outputs)
+
+    def __len__(self):
+        return len(self.rhs)
+
+    def dot(self, y_batch):
+        '''get mat * y for each row y of y_batch (shape (n, num_outputs)), returns shape (n, len(self))'''
+
+        return sparse_dot(self.indptr, self.indices, self.data, y_batch)
+
+    def select(self, start, end):
+        '''get the rows start to end'''
+
+        first, last = int(self.indptr[start]), int(self.indptr[end])
+
+        return SparseConstraints(self.indptr[start:end + 1] - first, self.indices[first:last], self.data[first:last],
+                                 self.rhs[start:end], self.num_outputs)
+
+    @staticmethod
+    def concatenate(parts, num_outputs):
+        '''stack the rows of a list of SparseConstraints'''
+
+        indptrs = [np.zeros(1, dtype=np.int64)]
+        nnz = 0
+
+        for part in parts:
+            indptrs.append(part.indptr[1:] + nnz)
+            nnz += len(part.data)
+
+        return SparseConstraints(np.concatenate(indptrs),
+                                 np.concatenate([np.zeros(0, dtype=np.int64)] + [p.indices for p in parts]),
+                                 np.concatenate([np.zeros(0)] + [p.data for p in parts]),
+                                 np.concatenate([np.zeros(0)] + [p.rhs for p in parts]), num_outputs)
+
+    def to_dense(self):
+        '''get (mat, rhs) with a dense mat, as in the list returned by read_vnnlib_simple'''
+
+        if len(self) == 0:
+            # same as np.array([]) produced by the previous parser
+            return np.zeros(0), np.zeros(0)
+
+        mat = np.zeros((len(self), self.num_outputs))
+        mat[np.repeat(np.arange(len(self)), np.diff(self.indptr)), self.indices] = self.data
+
+        return mat, self.rhs
+
+def sparse_dot(indptr, indices, data, y_batch):
+    '''multiply a CSR matrix without empty rows (see SparseConstraints) with each row of y_batch
+
+    returns shape (n, num_rows), computed without creating the dense matrix'''
+
+    num_rows = len(indptr) - 1
+
+    if num_rows == 0:
+        return np.zeros((len(y_batch), 0))
+
+    products = y_batch[:, indices] * data
+
+    return np.add.reduceat(products, indptr[:-1], axis=1)
+
+def get_spec_constraints(arrays):
+    '''get the stacked rows of all terms of a spec given as arrays (see VnnlibSpec.to_arrays) as SparseConstraints'''
+
+    return SparseConstraints(arrays['mat_indptr'], arrays['mat_indices'], arrays['mat_data'], arrays['rhs'],
+                             int(arrays['mat_shape'][1]))
+
+def get_factor_ranges(arrays):
+    '''get (box_start, box_end, term_start, term_end) for each factor of a spec given as arrays'''
+
+    box_ends = np.cumsum(arrays['factor_boxes']).tolist()
+    term_ends = np.cumsum(arrays['factor_terms']).tolist()
+
+    return list(zip([0] + box_ends[:-1], box_ends, [0] + term_ends[:-1], term_ends))
+
+class VnnlibFactor:
+    '''one disjunction of a vnnlib file
+
+    boxes is a list of distinct input boxes, each a 2-tuple (lb, ub) of float64 arrays. terms lists the
+    disjuncts in file order, each a 2-tuple (box_index, SparseConstraints as in mat * y <= rhs). Every term also
+    contains the rows of the top-level asserts, base_rows is the number of those before and after its own rows.
+    '''
+
+    def __init__(self, boxes, terms, base_rows):
+        self.boxes = boxes
+        self.terms = terms
+        self.base_rows = base_rows
+
+    def get_spec_lists(self):
+        '''get the terms grouped by box: a list with the list of SparseConstraints for each box'''
+
+        rv = [[] for _ in self.boxes]
+
+        for box_index, term in self.terms:
+            rv[box_index].append(term)
+
+        return rv
+
+class VnnlibSpec:
+    '''a parsed vnnlib file, as a conjunction of factors
+
+    there is a VnnlibFactor for each (assert (or ...)) statement, or a single one with a single term if there are
+    none. A counterexample must violate every factor, which is checked factor by factor, so the cartesian product
+    of the disjunctions is only built by expand().
+    '''
+
+    def __init__(self, num_inputs, num_outputs, factors):
+        assert factors
+
+        self.num_inputs = num_inputs
+        self.num_outputs = num_outputs
+        self.factors = factors
+
+    def expand(self):
+        '''get the equivalent VnnlibSpec with a single factor, the cartesian product of all factors
+
+        boxes, terms and rows are in the order of the list returned by read_vnnlib_simple. The number of terms is
+        the product of the number of terms in each factor, less the combinations whose input box is empty.
+        '''
+
+        if len(self.factors) == 1:
+            return self
+
+        # the rows of the top-level asserts, and where each factor's own rows go between them
+        _, first_term = self.factors[0].terms[0]
+        before, after = self.factors[0].base_rows
+        base = SparseConstraints.concatenate([first_term.select(0, before),
+                                              first_term.select(len(first_term) - after, len(first_term))],
+                                             self.num_outputs)
+        base_splits = [factor.base_rows[0] for factor in self.factors] + [len(base)]
+
+        factor_terms = []
+
+        for factor in self.factors:
+            before, after = factor.base_rows
+            factor_terms.append([(factor.boxes[box_index], term.select(before, len(term) - after))
+                                 for box_index, term in factor.terms])
+
+        box_to_index = {}
+        boxes = []
+        terms = []
+
+        for combination in itertools.product(*factor_terms):
+            lb = np.max([box_lb for (box_lb, _), _ in combination], axis=0)
+            ub = np.min([box_ub for (_, box_ub), _ in combination], axis=0)
+
+            if np.any(lb > ub):
+                # this combination of disjuncts can't be satisfied
+                continue
+
+            key = lb.tobytes() + ub.tobytes()
+            index = box_to_index.get(key)
+
+            if index is None:
+                index = box_to_index[key] = len(boxes)
+                boxes.append((lb, ub))
+
+            parts = [base.select(0, base_splits[0])]
+
+            for f, (_, own) in enumerate(combination):
+                parts += [own, base.select(base_splits[f], base_splits[f + 1])]
+
+            terms.append((index, SparseConstraints.concatenate(parts, self.num_outputs)))
+
+        assert terms, "input set is empty, no combination of disjuncts has a nonempty input box"
+
+        base_rows = (base_splits[0], len(base) - base_splits[-2])
+
+        return VnnlibSpec(self.num_inputs, self.num_outputs, [VnnlibFactor(boxes, terms, base_rows)])
+
+    def to_box_spec_list(self):
+        '''convert to the list format returned by read_vnnlib_simple, with dense (mat, rhs) pairs
+
+        this expands the factors, see expand()'''
+
+        factor = self.expand().factors[0]
+        rv = []
+
+        for (lb, ub), spec_list in zip(factor.boxes, factor.get_spec_lists()):
+            box = [[l, u] for l, u in zip(lb.tolist(), ub.tolist())]
+            rv.append((box, [term.to_dense() for term in spec_list]))
+
+        return rv
+
+    def to_arrays(self):
+        '''get the spec as a dict of numpy arrays, the inverse of from_arrays()
+
+        the boxes of all factors are stacked into lb / ub of shape (num_boxes, num_inputs). The rows of all terms
+        are stacked into a single CSR matrix (mat_indptr, mat_indices, mat_data, with shape mat_shape) and rhs,
+        where term i has term_rows[i] rows and belongs to box term_box[i]. Factor f has the next factor_boxes[f]
+        boxes and factor_terms[f] terms, and factor_base_rows[f] is its base_rows.
+        '''
+
+        boxes = []
+        term_box = []
+        terms = []
+
+        for factor in self.factors:
+            for box_index, term in factor.terms:
+                term_box.append(len(boxes) + box_index)
+                terms.append(term)
+
+            boxes += factor.boxes
+
+        mat = SparseConstraints.concatenate(terms, self.num_outputs)
+        shape = (len(boxes), self.num_inputs)
+
+        return {'lb': np.array([lb for lb, _ in boxes], dtype=float).reshape(shape),
+                'ub': np.array([ub for _, ub in boxes], dtype=float).reshape(shape),
+                'mat_indptr': mat.indptr,
+                'mat_indices': mat.indices,
+                'mat_data': mat.data,
+                'mat_shape': np.array([len(mat), self.num_outputs], dtype=np.int64),
+                'rhs': mat.rhs,
+                'term_box': np.array(term_box, dtype=np.int64),
+                'term_rows': np.array([len(term) for term in terms], dtype=np.int64),
+                'factor_boxes': np.array([len(factor.boxes) for factor in self.factors], dtype=np.int64),
+                'factor_terms': np.array([len(factor.terms) for factor in self.factors], dtype=np.int64),
+                'factor_base_rows': np.array([factor.base_rows for factor in self.factors],
+                                             dtype=np.int64).reshape(-1, 2)}
+
+    @staticmethod
+    def from_arrays(arrays):
+        '''create a VnnlibSpec from the dict returned by to_arrays(). The arrays may be read-only memory maps'''
+
+        lb, ub = arrays['lb'], arrays['ub']
+        num_inputs = lb.shape[1]
+        num_outputs = int(arrays['mat_shape'][1])
+
+        mat = get_spec_constraints(arrays)
+        term_box = arrays['term_box'].tolist()
+        term_ends = np.cumsum(arrays['term_rows']).tolist()
+        factors = []
+
+        for f, (box_start, box_end, term_start, term_end) in enumerate(get_factor_ranges(arrays)):
+            boxes = [(lb[i], ub[i]) for i in range(box_start, box_end)]
+            terms = []
+
+            for t in range(term_start, term_end):
+                start = term_ends[t - 1] if t > 0 else 0
+                terms.append((term_box[t] - box_start, mat.select(start, term_ends[t])))
+
+            base_rows = tuple(arrays['factor_base_rows'][f].tolist())
+            factors.append(VnnlibFactor(boxes, terms, base_rows))
+
+        return VnnlibSpec(num_inputs, num_outputs, factors)
+
+    def compile(self):
+        '''get a SpecEvaluator, to check many inputs and outputs against the spec at once'''
+
+        return SpecEvaluator(self.to_arrays())
+
+class SpecEvaluator:
+    '''a compiled VnnlibSpec, which checks batches of inputs and outputs with a few numpy operations
+
+    the spec is kept as the stacked arrays of VnnlibSpec.to_arrays() (possibly memory maps from the cache), along
+    with the index arrays derived from them, so no python loop over boxes, terms or rows is needed.
+    '''
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+
+        self.lb = arrays['lb']
+        self.ub = arrays['ub']
+        self.mat = get_spec_constraints(arrays)
+
+        self.num_inputs = self.lb.shape[1]
+        self.num_outputs = self.mat.num_outputs
 
-def get_io_nodes(onnx_model):
-    'returns 3 -tuple: input node, output nodes, input dtype'
+        self.term_box = np.array(arrays['term_box'])
+        self.term_ends = np.cumsum(arrays['term_rows'])
+        self.term_starts = self.term_ends - arrays['term_rows']
+
+        # (box_start, box_end, term_start, term_end) of each factor
+        self.factor_ranges = get_factor_ranges(arrays)
+        self.factor_box_starts = np.array([r[0] for r in self.factor_ranges], dtype=np.int64)
+        self.factor_term_starts = np.array([r[2] for r in self.factor_ranges], dtype=np.int64)
+
+    def get_inside(self, x_batch, tol=0.0):
+        '''get a bool array (n, num_boxes): is x_batch[k] in box i, allowing tol outside of the bounds'''
+
+        x = np.asarray(x_batch, dtype=float).reshape(-1, 1, self.num_inputs)
+
+        return ~np.any((x < self.lb - tol) | (x > self.ub + tol), axis=2)
+
+    def get_term_sat(self, y_batch, tol=0.0):
+        '''get a bool array (n, num_terms): does y_batch[k] satisfy all rows of term t, as in mat * y <= rhs + tol'''
+
+        y_batch = np.asarray(y_batch, dtype=float).reshape(-1, self.num_outputs)
+
+        # evaluate the rows of all terms with one sparse product, a term is satisfied if it has no unsatisfied rows
+        unsat_rows = ~(self.mat.dot(y_batch) <= self.mat.rhs + tol)
+        cum_unsat = np.concatenate([np.zeros((len(y_batch), 1), dtype=np.int64), np.cumsum(unsat_rows, axis=1)],
+                                   axis=1)
+
+        return cum_unsat[:, self.term_ends] == cum_unsat[:, self.term_starts]
+
+    def contains(self, x_batch, tol=0.0):
+        '''get a bool array (n,): is each input in the input set, inside a box of every factor'''
+
+        return self.get_contained(self.get_inside(x_batch, tol))
+
+    def get_contained(self, inside):
+        '''get contains() from the result of get_inside(), for callers that need both'''
+
+        return np.logical_or.reduceat(inside, self.factor_box_starts, axis=1).all(axis=1)
+
+    def violates(self, y_batch, tol=0.0, x_batch=None):
+        '''get a bool array (n,): does each output satisfy a term of every factor, so that it violates the property
+
+        if x_batch is given, only the terms whose input box contains the corresponding input count. If x_batch is
+        None, the input boxes are not checked at all: outputs are counted as violating regardless of the input,
+        which is only meaningful if all terms have the same box and the inputs were checked with contains().
+        '''
+
+        term_sat = self.get_term_sat(y_batch, tol)
+
+        if x_batch is not None:
+            term_sat &= self.get_inside(x_batch, tol)[:, self.term_box]
+
+        return np.logical_or.reduceat(term_sat, self.factor_term_starts, axis=1).all(axis=1)
+
+    def get_term(self, t):
+        '''get the SparseConstraints of term t'''
+
+        return self.mat.select(self.term_starts[t], self.term_ends[t])
+
+def get_io_nodes(onnx_model, sess=None):
+    'returns 3 -tuple: input node, output nodes, input dtype. An existing InferenceSession can be passed in as sess'
+
+    if sess is None:
+        sess = ort.InferenceSession(onnx_model.SerializeToString())
 
-    sess = ort.InferenceSession(onnx_model.SerializeToString())
     inputs = [i.name for i in sess.get_inputs()]
     assert len(inputs) == 1, f"expected single onnx network input, got: {inputs}"
     input_name = inputs[0]
@@ -170,12 +576,11 @@ def get_num_inputs_outputs(onnx_filename):
     for n in out_shape:
         num_outputs *= n
 
-@cachier(stale_after=datetime.timedelta(days=1))
 def read_vnnlib_simple(vnnlib_filename, num_inputs, num_outputs):
     '''process in a vnnlib file. You can get num_inputs and num_outputs using get_num_inputs_outputs().
 
-    this is not a general parser, and assumes files are provided in a 'nice' format. Only a single disjunction
-    is allowed
+    this is not a general parser, and assumes files are provided in a 'nice' format. Several disjunctions are
+    expanded into their cartesian product (see VnnlibSpec.expand)
 
     output a list containing 2-tuples:
         1. input ranges (box), list of pairs for each input variable
@@ -183,6 +588,178 @@ def read_vnnlib_simple(vnnlib_filename, num_inputs, num_outputs):
                           Each element in the list is a term in a disjunction for the specification.
     '''
 
+    return read_vnnlib_spec_cached(vnnlib_filename, num_inputs, num_outputs).to_box_spec_list()
+
+def read_vnnlib_spec_cached(vnnlib_filename, num_inputs, num_outputs):
+    '''read_vnnlib_spec() with an on-disk cache in Settings.VNNLIB_CACHE_DIR, see read_vnnlib_arrays_cached()'''
+
+    return VnnlibSpec.from_arrays(read_vnnlib_arrays_cached(vnnlib_filename, num_inputs, num_outputs))
+
+def read_vnnlib_arrays_cached(vnnlib_filename, num_inputs, num_outputs):
+    '''get the arrays of a vnnlib spec (see VnnlibSpec.to_arrays), using an on-disk cache in
+    Settings.VNNLIB_CACHE_DIR
+
+    The cache is content-addressed: the key is a hash of the vnnlib file plus num_inputs and num_outputs, so
+    entries never expire but are not reused once the file changes. Each entry is a directory of .npy files,
+    loaded as read-only memory maps.
+    '''
+
+    key = f"v{VNNLIB_CACHE_VERSION}_{file_sha256(vnnlib_filename)}_{num_inputs}_{num_outputs}"
+    cache_dir = Settings.VNNLIB_CACHE_DIR
+    entry_dir = Path(cache_dir) / key
+
+    profiling.count("vnnlib_cache_hits" if entry_dir.is_dir() else "vnnlib_cache_misses")
+
+    if entry_dir.is_dir():
+        return {name: np.load(entry_dir / f"{name}.npy", mmap_mode='r') for name in VNNLIB_CACHE_ARRAYS}
+
+    arrays = read_vnnlib_spec(vnnlib_filename, num_inputs, num_outputs).to_arrays()
+
+    # write to a temporary directory and rename it, so readers never see a partial entry
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(dir=cache_dir, prefix=".tmp_"))
+
+    for name, array in arrays.items():
+        np.save(tmp_dir / f"{name}.npy", array)
+
+    try:
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        # another process wrote the same entry first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return arrays
+
+def get_spec_evaluator(vnnlib_filename, num_inputs, num_outputs):
+    '''get a SpecEvaluator for a vnnlib file, using the on-disk cache of read_vnnlib_arrays_cached()
+
+    evaluators for the most recently used files are also kept in memory, by file contents'''
+
+    return _get_spec_evaluator(file_sha256(vnnlib_filename), vnnlib_filename, num_inputs, num_outputs)
+
+@functools.lru_cache(maxsize=SPEC_EVALUATOR_CACHE_SIZE)
+def _get_spec_evaluator(_sha256, vnnlib_filename, num_inputs, num_outputs):
+    '''get_spec_evaluator() memoized by file hash'''
+
+    return SpecEvaluator(read_vnnlib_arrays_cached(vnnlib_filename, num_inputs, num_outputs))
+
+_file_sha256_memo = {}
+
+def file_sha256(filename):
+    '''get the sha256 hex digest of a file's contents, memoized per process by path, size and mtime
+
+    hashes of files of at least FILE_SHA256_STORE_MIN_BYTES are also kept in the verdict store, so they are not
+    computed again in later runs'''
+
+    stat = os.stat(filename)
+    memo_key = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+    rv = _file_sha256_memo.get(memo_key)
+    profiling.count("file_sha256_memo_hits" if rv is not None else "file_sha256_memo_misses")
+
+    if rv is not None:
+        return rv
+
+    stored = stat.st_size >= FILE_SHA256_STORE_MIN_BYTES
+
+    if stored:
+        rv = get_verdict_store().get_file_hash(memo_key)
+        profiling.count("file_sha256_store_hits" if rv is not None else "file_sha256_store_misses")
+
+    if rv is None:
+        h = hashlib.sha256()
+
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+
+        rv = h.hexdigest()
+
+        if stored:
+            get_verdict_store().put_file_hash(memo_key, rv)
+
+    _file_sha256_memo[memo_key] = rv
+
+    return rv
+
+@profiled("parse_vnnlib")
+def read_vnnlib_spec(vnnlib_filename, num_inputs, num_outputs, use_fast_path=True):
+    '''process in a vnnlib file, returning a VnnlibSpec with dense numpy input boxes
+
+    accepts the same format as read_vnnlib_simple. Files up to VNNLIB_FAST_PATH_MAX_BYTES first go through
+    read_box_constraints_fast(), which handles the top-level input box constraints of the whole file in one scan.
+    The remaining statements (or the whole file, if the fast path doesn't apply) go to parse_vnnlib_statements().
+    '''
+
+    lb = np.full(num_inputs, -np.inf)
+    ub = np.full(num_inputs, np.inf)
+    statements = None
+
+    if use_fast_path and Path(vnnlib_filename).stat().st_size <= VNNLIB_FAST_PATH_MAX_BYTES:
+        statements = read_box_constraints_fast(vnnlib_filename, lb, ub)
+
+    if statements is None:
+        lb.fill(-np.inf)
+        ub.fill(np.inf)
+        statements = iter_statements(vnnlib_filename)
+
+    return parse_vnnlib_statements(statements, num_inputs, num_outputs, lb, ub)
+
+def read_box_constraints_fast(vnnlib_filename, lb, ub):
+    '''fast path for the usual vnnlib layout, where the input is constrained by top-level
+    "(assert (<= X_i c))" / "(assert (>= X_i c))" statements
+
+    all such statements are found with a single regex scan over the file, and their bounds are applied to lb and
+    ub (modified in place) with numpy. Declarations are also dropped. returns the list of remaining statements,
+    or None if the box constraints could not be handled here, in which case the general parser should be used
+    on the whole file (which will also produce the proper error message)
+    '''
+
+    with open(vnnlib_filename, 'r') as f:
+        text = f.read()
+
+    text = REGEX_COMMENT.sub("", text)
+
+    matches = REGEX_BOX_ASSERT.findall(text)
+
+    if matches:
+        ops, indices, values = zip(*matches)
+
+        try:
+            value_array = np.array(values).astype(float)
+        except ValueError:
+            # not a box constraint
+            return None
+
+        index_array = np.array(indices, dtype=int)
+
+        if np.any(index_array >= len(lb)):
+            return None
+
+        is_upper = np.array(ops) == "<="
+
+        np.minimum.at(ub, index_array[is_upper], value_array[is_upper])
+        np.maximum.at(lb, index_array[~is_upper], value_array[~is_upper])
+
+        if np.any(lb > ub):
+            return None
+
+        text = REGEX_BOX_ASSERT.sub("", text)
+
+    text = REGEX_DECLARE_ANY.sub("", text)
+
+    if not text.strip():
+        return []
+
+    return list(iter_statements_from_lines(text.splitlines()))
+
+def parse_vnnlib_statements(statements, num_inputs, num_outputs, lb, ub):
+    '''parse vnnlib statements into a VnnlibSpec, starting from the input box lb, ub
+
+    Each statement is tokenized once, input bounds are written directly into float64 arrays, and the input box is
+    shared between terms of a disjunction that only add output constraints. Terms are merged based on the bytes
+    of their input box.
+    '''
+
     # example: "(declare-const X_0 Real)"
     regex_declare = re.compile(r"^\(declare-const (X|Y)_(\S+) Real\)$")
 
@@ -200,93 +777,175 @@ def read_vnnlib_simple(vnnlib_filename, num_inputs, num_outputs):
     # (assert (or (and (<= Y_3 Y_0)(<= Y_3 Y_1)(<= Y_3 Y_2))(and (<= Y_4 Y_0)(<= Y_4 Y_1)(<= Y_4 Y_2))))
     regex_dnf = re.compile(r"^\(assert \(or (" + dnf_clause_str + r")+\)\)$")
 
-    rv = [] # list of 3-tuples, (box-dict, mat, rhs)
-    rv.append((make_input_box_dict(num_inputs), [], []))
-    
-    lines = read_statements(vnnlib_filename)
+    # the top-level asserts, which apply to every term
+    base = VnnlibTerm(lb, ub, [], [], True)
 
-    for line in lines:
-        #print(f"Line: {line}")
+    # one for each disjunction: the list of terms, and the number of base rows when it was read
+    factors = []
+
+    def add_top_level_constraint(op, first, second):
+        terms = [base] + [term for factor_terms, _ in factors for term in factor_terms]
 
-        if len(regex_declare.findall(line)) > 0:
+        if first.startswith("X_") or second.startswith("X_"):
+            # update each distinct (possibly shared) input box once
+            updated_boxes = set()
+
+            for term in terms:
+                if id(term.lb) not in updated_boxes:
+                    updated_boxes.add(id(term.lb))
+                    term.add_constraint(op, first, second, num_inputs, num_outputs, copy_box=False)
+        else:
+            for term in terms:
+                term.add_constraint(op, first, second, num_inputs, num_outputs)
+
+    def add_disjunction(conjuncts):
+        # each disjunction becomes a separate factor, rather than multiplying out the terms of earlier ones
+        factor_terms = []
+
+        for conjunct in conjuncts:
+            new_term = base.split()
+            factor_terms.append(new_term)
+
+            for op, first, second in conjunct:
+                new_term.add_constraint(op, first, second, num_inputs, num_outputs)
+
+        factors.append((factor_terms, len(base.rows)))
+    
+    for line in statements:
+        if line.startswith("(declare-const") and regex_declare.match(line):
             continue
 
         groups = regex_simple_assert.findall(line)
 
         if groups:
             assert len(groups[0]) == 3, f"groups was {groups}: {line}"
-            op, first, second = groups[0]
-
-            for rv_tuple in rv:
-                update_rv_tuple(rv_tuple, op, first, second, num_inputs, num_outputs)
-                
+            add_top_level_constraint(*groups[0])
             continue
 
         ################
-        groups = regex_dnf.findall(line)
-        assert groups, f"failed parsing line: {line}"
-        
-        tokens = line.replace("(", " ").replace(")", " ").split()
-        tokens = tokens[2:] # skip 'assert' and 'or'
+        if regex_dnf.match(line):
+            tokens = line.replace("(", " ").replace(")", " ").split()
+            tokens = tokens[2:] # skip 'assert' and 'or'
 
-        conjuncts = " ".join(tokens).split("and")[1:]
+            # list of conjuncts, each a list of (op, first, second)
+            conjuncts = []
 
-        old_rv = rv
-        rv = []
+            for token_index, token in enumerate(tokens):
+                if token == "and":
+                    conjuncts.append([])
+                elif token in ("<=", ">="):
+                    conjuncts[-1].append(tuple(tokens[token_index:token_index+3]))
+
+            add_disjunction(conjuncts)
+            continue
+
+        # any other nesting of and / or, as a conjunction of disjunctions
+        expr = parse_expression(line)
+        assert len(expr) == 2 and expr[0] == "assert", f"failed parsing line: {line}"
+
+        for conjuncts in get_expression_factors(expr[1]):
+            if len(conjuncts) == 1:
+                for comparison in conjuncts[0]:
+                    add_top_level_constraint(*comparison)
+            else:
+                add_disjunction(conjuncts)
+
+    if not factors:
+        factors.append(([base], len(base.rows)))
 
-        for rv_tuple in old_rv:
-            for c in conjuncts:
-                rv_tuple_copy = deepcopy(rv_tuple)
-                rv.append(rv_tuple_copy)
-                
-                c_tokens = [s for s in c.split(" ") if len(s) > 0]
+    rv = []
 
-                count = len(c_tokens) // 3
+    # an expanded term is unbounded if every factor has a term that is unbounded in the same input and direction
+    no_lb = np.ones(num_inputs, dtype=bool)
+    no_ub = np.ones(num_inputs, dtype=bool)
 
-                for i in range(count):
-                    op, first, second = c_tokens[3*i:3*(i+1)]
+    for factor_terms, num_base_rows in factors:
+        # disjuncts whose input box is empty can never be satisfied, but all of them being empty is an error
+        nonempty_terms = [term for term in factor_terms if np.all(term.lb <= term.ub)]
 
-                    update_rv_tuple(rv_tuple_copy, op, first, second, num_inputs, num_outputs)
+        if not nonempty_terms:
+            term = factor_terms[0]
+            d = int(np.argmax(term.lb > term.ub))
+            assert False, f"X_{d} range is empty: {[float(term.lb[d]), float(term.ub[d])]}"
 
-    # merge elements of rv with the same input spec
-    merged_rv = {}
+        factor_terms = nonempty_terms
 
-    for rv_tuple in rv:
-        boxdict = rv_tuple[0]
-        matrhs = (rv_tuple[1], rv_tuple[2])
+        # merge terms with the same input box
+        box_to_index = {}
+        boxes = []
+        terms = []
 
-        key = str(boxdict) # merge based on string representation of input box... accurate enough for now
+        for term in factor_terms:
+            key = term.lb.tobytes() + term.ub.tobytes()
+            index = box_to_index.get(key)
 
-        if key in merged_rv:
-            merged_rv[key][1].append(matrhs)
+            if index is None:
+                index = box_to_index[key] = len(boxes)
+                boxes.append((term.lb, term.ub))
+
+            terms.append((index, SparseConstraints.from_rows(term.rows, term.rhs, num_outputs)))
+
+        no_lb &= np.any([np.isinf(box_lb) for box_lb, _ in boxes], axis=0)
+        no_ub &= np.any([np.isinf(box_ub) for _, box_ub in boxes], axis=0)
+
+        rv.append(VnnlibFactor(boxes, terms, (num_base_rows, len(base.rows) - num_base_rows)))
+
+    unbounded = no_lb | no_ub
+
+    if np.any(unbounded):
+        d = int(np.argmax(unbounded))
+        assert False, f"input X_{d} was unbounded: {[base.lb[d], base.ub[d]]}"
+
+    return VnnlibSpec(num_inputs, num_outputs, rv)
+
+def parse_expression(statement):
+    '''parse a statement into nested lists of tokens, for example "(assert (<= Y_0 1))" becomes
+    ['assert', ['<=', 'Y_0', '1']]'''
+
+    stack = [[]]
+
+    for token in statement.replace("(", " ( ").replace(")", " ) ").split():
+        if token == "(":
+            stack.append([])
+        elif token == ")":
+            assert len(stack) > 1, f"mismatched parenthesis: {statement}"
+            expr = stack.pop()
+            stack[-1].append(expr)
         else:
-            merged_rv[key] = (boxdict, [matrhs])
+            stack[-1].append(token)
+
+    assert len(stack) == 1 and len(stack[0]) == 1 and isinstance(stack[0][0], list), \
+        f"failed parsing statement: {statement}"
+
+    return stack[0][0]
+
+def get_expression_factors(expr):
+    '''get a parsed and / or expression of comparisons as a conjunction of disjunctions, the list of
+    get_expression_dnf() of each one. A top-level and is split up, so only an or nested below it is multiplied out'''
+
+    if expr and expr[0] == "and":
+        return [factor for sub_expr in expr[1:] for factor in get_expression_factors(sub_expr)]
+
+    return [get_expression_dnf(expr)]
 
-    # finalize objects (convert dicts to lists and lists to np.array)
-    final_rv = []
+def get_expression_dnf(expr):
+    '''get a parsed and / or expression of comparisons in disjunctive normal form: a list of conjuncts, each a list
+    of (op, first, second)'''
 
-    for rv_tuple in merged_rv.values():
-        box_dict = rv_tuple[0]
-        
-        box = []
+    assert isinstance(expr, list) and expr, f"expected an expression, got: {expr}"
+    op = expr[0]
 
-        for d in range(num_inputs):
-            r = box_dict[d]
+    if op in ("<=", ">="):
+        assert len(expr) == 3 and isinstance(expr[1], str) and isinstance(expr[2], str), \
+            f"unsupported comparison: {expr}"
 
-            assert r[0] != -np.inf and r[1] != np.inf, f"input X_{d} was unbounded: {r}"
-            box.append(r)
-            
-        spec_list = []
+        return [[tuple(expr)]]
 
-        for matrhs in rv_tuple[1]:
-            mat = np.array(matrhs[0], dtype=float)
-            rhs = np.array(matrhs[1], dtype=float)
-            spec_list.append((mat, rhs))
+    assert op in ("and", "or") and len(expr) > 1, f"unsupported expression: {expr}"
 
-        final_rv.append((box, spec_list))
+    dnfs = [get_expression_dnf(sub_expr) for sub_expr in expr[1:]]
 
-    #for i, (box, spec_list) in enumerate(final_rv):
-    #    print(f"-----\n{i+1}. {box}\nspec:{spec_list}")
-        
-    return final_rv
+    if op == "or":
+        return [conjunct for dnf in dnfs for conjunct in dnf]
 
+    return [[comparison for conjunct in conjuncts for comparison in conjunct] for conjuncts in itertools.product(*dnfs)]